@@ -1,8 +1,15 @@
 from TelosAirSAMDBoardFlashGUI.ui.app import TelosAirApp
 from TelosAirSAMDBoardFlashGUI.context import CONTEXT
 from TelosAirSAMDBoardFlashGUI.callbacks.refresh_button import refresh_button_callback
+from TelosAirSAMDBoardFlashGUI.util.provision import Provisioner, ProvisioningSource
+from TelosAirSAMDBoardFlashGUI.util.backup import ChunkStore
+from TelosAirSAMDBoardFlashGUI.util.assignment import load_rules
+from TelosAirSAMDBoardFlashGUI.util.samba import VERIFY_MODES, VERIFY_FULL
+from TelosAirSAMDBoardFlashGUI.util.journal import BatchJournal
 
+import argparse
 import logging
+import os
 logger = logging.getLogger("TelosAir")
 formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -12,15 +19,45 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
+def parse_args():
+    parser = argparse.ArgumentParser(prog="TelosAirSAMDBoardFlashGUI")
+    parser.add_argument("--provisioning", metavar="PATH", default=None,
+                        help="CSV or SQLite file of per-serial provisioning records to patch into each image flashed.")
+    parser.add_argument("--backup-dir", metavar="PATH", default=None,
+                        help="Back up each board's current firmware into this deduplicated store before flashing it.")
+    parser.add_argument("--rules", metavar="PATH", default=None,
+                        help="JSON file of firmware assignment rules used by \"Flash All\".")
+    parser.add_argument("--verify", choices=VERIFY_MODES, default=VERIFY_FULL,
+                        help="How to verify each write: bossac -v (default), bootloader CRC from our own SAM-BA "
+                             "client (full read-back if unsupported), or read back only a sample of pages.")
+    parser.add_argument("--journal", metavar="PATH", default=os.path.join(os.path.expanduser("~"), ".telosair", "batch_journal.jsonl"),
+                        help="Where to journal batch flashes so they can be resumed after a crash.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     logger.info("Starting.")
     app = TelosAirApp()
     #TODO: Use ini file or something
     refresh_button_callback()
     CONTEXT.init(app, client_name="TestClient", db_url="http://127.0.0.1:5001")
+    CONTEXT.verify_mode = args.verify
+    CONTEXT.journal = BatchJournal(args.journal)
+    if args.provisioning:
+        CONTEXT.provisioner = Provisioner(ProvisioningSource(args.provisioning))
+    if args.backup_dir:
+        CONTEXT.backup_store = ChunkStore(args.backup_dir)
+    if args.rules:
+        CONTEXT.assignment_rules = load_rules(args.rules)
     
 
     app.mainloop()
+    CONTEXT.journal.close()
+    if CONTEXT.executor.running:
+        # Pool workers aren't daemon threads, so the interpreter would otherwise wait for a flash
+        # to finish with no window left to show it. The journal lets an interrupted batch resume.
+        logger.warning(f"Quitting with {CONTEXT.executor.running} background jobs still running.")
+        os._exit(0)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,32 @@
 from TelosAirSAMDBoardFlashGUI.context import CONTEXT
 from TelosAirSAMDBoardFlashGUI.ui.widgets.action_popup import ActionPopup
+from TelosAirSAMDBoardFlashGUI.ui.widgets.plan_popup import PlanConfirmPopup
 from TelosAirSAMDBoardFlashGUI.util.bossa import *
+from TelosAirSAMDBoardFlashGUI.util.executor import ExecutorFull
+from TelosAirSAMDBoardFlashGUI.util.assignment import resolve_plan, PlanEntry
+from TelosAirSAMDBoardFlashGUI.util.interrogate import FIRMWARE_CACHE
+from TelosAirSAMDBoardFlashGUI.util.journal import STAGE_DONE, STAGE_SKIPPED, MID_WRITE_STAGES, UnfinishedBatch
 from TelosAirSAMDBoardFlashGUI.util.files import DEVICE_FILE_PATHS
+from tkinter import messagebox
 import os
 
+POST_FLASH_REFRESH_DELAY_MS = 2000
+BATCH_WINDOW_TITLE = "TelosAirBoardManager - Batch Flashing"
+
+def _after_flash(*args):
+    CONTEXT.board_list = []
+    # Flashed boards reset and run something new, so probe them again.
+    FIRMWARE_CACHE.clear()
+    CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_INSPECT)
+    CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_DEVICES)
+
+    # Give the board time to re-enumerate before looking for it again.
+    def _refresh():
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.REFRESH)
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_INSPECT)
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_ENABLE)
+    CONTEXT.root.after(POST_FLASH_REFRESH_DELAY_MS, _refresh)
+
 def flash_button_callback(*args):
     fileidx = CONTEXT.file_selected
     if fileidx is None:
@@ -19,33 +42,155 @@ def flash_button_callback(*args):
         logger.error(f"Failed due to Nonetype filepath.")
         return
 
+    board = CONTEXT.board_selected
+    if board is None:
+        logger.error(f"Failed due to Nonetype board.")
+        return
+
     logger.info(f"Selected file is {filepath}.")
 
-    class FlashProcessThread(Thread):
-        def __init__(self, board: Board):
-            self.board = board
-            self.updates_queue = Queue()
-            super().__init__(daemon=True)
-
-        def run(self):
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_DISABLE)
-            th = FlashThread(board=CONTEXT.board_selected, filepath=filepath, updates_queue=self.updates_queue)
-            th.start()
-            popup = ActionPopup(root=CONTEXT.root, starting_text="Beginning flashing process.", 
-                                msg_queue=self.updates_queue, window_title="TelosAirBoardManager - Board Flashing")
-            
-            th.join()
-            
-            CONTEXT.board_list = []
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_INSPECT)
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_DEVICES)
-            CONTEXT.root.update()
-            sleep(2)
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.REFRESH)
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.CLEAR_INSPECT)
-            CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_ENABLE)
-
-    th = FlashProcessThread(CONTEXT.board_selected)
-    th.start()
-
-CONTEXT.bind_root(CONTEXT.EVENTS.FLASH_BUTTON, flash_button_callback)
\ No newline at end of file
+    task_key = (CONTEXT.FLASH_TASK_KEY, board.serial_number)
+    if CONTEXT.executor.is_pending(task_key):
+        logger.info(f"Already flashing {board}, ignoring.")
+        return
+
+    updates_queue = Queue()
+    job = FlashJob(board=board, filepath=filepath, updates_queue=updates_queue, provisioner=CONTEXT.provisioner,
+                   backup_store=CONTEXT.backup_store, verify_mode=CONTEXT.verify_mode)
+
+    def _on_error(err):
+        # The popup only closes on a final message, so make sure it gets one.
+        updates_queue.put(('Flashing failed. (Exception)', False, False))
+        _after_flash()
+
+    try:
+        CONTEXT.executor.submit(job.run, key=task_key, on_done=_after_flash, on_error=_on_error)
+    except ExecutorFull as e:
+        logger.error(f"Not flashing {board}: {e}")
+        messagebox.showwarning("TelosAirBoardManager - Board Flashing", "Too many jobs are already running. Please wait and try again.")
+        return
+
+    CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_DISABLE)
+    ActionPopup(root=CONTEXT.root, starting_text="Beginning flashing process.", 
+                msg_queue=updates_queue, window_title="TelosAirBoardManager - Board Flashing")
+
+def flash_all_button_callback(*args):
+    if CONTEXT.executor.is_pending(CONTEXT.FLASH_ALL_TASK_KEY):
+        logger.info("Batch already running, ignoring.")
+        return
+
+    default_image = None
+    if CONTEXT.file_selected is not None and 0 <= CONTEXT.file_selected < len(DEVICE_FILE_PATHS):
+        default_image = DEVICE_FILE_PATHS[CONTEXT.file_selected]
+
+    plan = resolve_plan(CONTEXT.board_list, CONTEXT.assignment_rules, default_image)
+    todo = [entry for entry in plan if entry.filepath]
+    logger.info("Batch plan:\n" + "\n".join(str(entry) for entry in plan))
+    if not todo:
+        messagebox.showwarning(BATCH_WINDOW_TITLE, "No connected board has an image assigned to it. Select a device program or add a rule.")
+        return
+
+    def _confirmed():
+        if CONTEXT.flash_pending():
+            logger.info("A flash started while confirming, not starting batch.")
+            return
+        _start_batch(plan, f"Flashing {len(todo)} boards.")
+
+    PlanConfirmPopup(root=CONTEXT.root, summary_text=f"Flash {len(todo)} of {len(plan)} connected boards?",
+                     lines=[str(entry) for entry in plan], on_confirm=_confirmed, window_title=BATCH_WINDOW_TITLE)
+
+def _start_batch(plan: 'list[PlanEntry]', starting_text: str, batch_id: str = None):
+    updates_queue = Queue()
+    job = BatchFlashJob(plan=plan, updates_queue=updates_queue, provisioner=CONTEXT.provisioner, backup_store=CONTEXT.backup_store,
+                         verify_mode=CONTEXT.verify_mode, journal=CONTEXT.journal, batch_id=batch_id)
+
+    def _on_error(err):
+        updates_queue.put(('Batch flashing failed. (Exception)', False, False))
+        _after_flash()
+
+    try:
+        CONTEXT.executor.submit(job.run, key=CONTEXT.FLASH_ALL_TASK_KEY, on_done=_after_flash, on_error=_on_error)
+    except ExecutorFull as e:
+        logger.error(f"Not starting batch: {e}")
+        messagebox.showwarning(BATCH_WINDOW_TITLE, "Too many jobs are already running. Please wait and try again.")
+        return
+
+    CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_DISABLE)
+    ActionPopup(root=CONTEXT.root, starting_text=starting_text,
+                msg_queue=updates_queue, window_title=BATCH_WINDOW_TITLE)
+
+def _offer_resume(batch: UnfinishedBatch):
+    """
+    Ask what to do with an interrupted `batch`: resume it with the boards that are connected, discard it,
+    or leave it for later. Unfinished boards that aren't connected are journaled as skipped and the
+    batch stays open until every board in it is done.
+    """
+    connected = {board.serial_number: board for board in CONTEXT.board_list}
+    unfinished = [e for e in batch.entries if e.stage != STAGE_DONE]
+    if not unfinished:
+        # Crashed after the last board but before the end record.
+        CONTEXT.journal.end_batch(batch.batch_id, reason="nothing left")
+        return
+
+    missing = [e for e in unfinished if e.serial_number not in connected]
+    for e in missing:
+        if e.stage != STAGE_SKIPPED:
+            CONTEXT.journal.record_stage(batch.batch_id, e.serial_number, STAGE_SKIPPED)
+    plan = [PlanEntry(connected[e.serial_number], e.filepath, "resumed", last_stage=e.stage)
+            for e in unfinished if e.serial_number in connected]
+
+    done = batch.count(STAGE_DONE)
+    mid_write = batch.count(*MID_WRITE_STAGES)
+    rest = len(unfinished) - mid_write
+    logger.info(f"Interrupted batch {batch.batch_id}: {done} done, {mid_write} mid-write, {rest} remaining, {len(missing)} not connected.")
+
+    msg = (f"A batch of {len(batch.entries)} boards was interrupted.\n\n"
+           f"{done} finished, {mid_write} were mid-write and will be re-checked, {rest} were not finished.")
+    if missing:
+        msg += f"\n\n{len(missing)} unfinished boards are not connected and will be skipped for now; the batch stays open for them."
+        logger.info(f"Not connected: {', '.join(e.serial_number for e in missing)}")
+    if not plan:
+        messagebox.showinfo(BATCH_WINDOW_TITLE, msg + "\n\nConnect them and use \"Resume Batch\" to finish it.")
+        return
+
+    answer = messagebox.askyesnocancel(BATCH_WINDOW_TITLE, msg + f"\n\nResume it now with {len(plan)} connected boards?\n\n"
+                                       "Yes: resume. No: discard the batch. Cancel: decide later with \"Resume Batch\".")
+    if answer is None:
+        return
+    if not answer:
+        CONTEXT.journal.end_batch(batch.batch_id, reason="abandoned")
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_ENABLE)
+        return
+
+    _start_batch(plan, f"Resuming batch: {len(plan)} boards.", batch_id=batch.batch_id)
+
+_resume_offered = False
+
+def offer_resume_callback(*args):
+    """
+    Once the first refresh after start-up is done, offer to resume a batch the journal shows was interrupted.
+    """
+    global _resume_offered
+    if _resume_offered or not CONTEXT.journal:
+        return
+    _resume_offered = True
+
+    batch = CONTEXT.journal.unfinished()
+    if batch is not None:
+        _offer_resume(batch)
+
+def resume_batch_button_callback(*args):
+    if not CONTEXT.journal or CONTEXT.flash_pending():
+        return
+
+    batch = CONTEXT.journal.unfinished()
+    if batch is None:
+        messagebox.showinfo(BATCH_WINDOW_TITLE, "No interrupted batch to resume.")
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_ENABLE)
+        return
+    _offer_resume(batch)
+
+CONTEXT.bind_root(CONTEXT.EVENTS.FLASH_BUTTON, flash_button_callback)
+CONTEXT.bind_root(CONTEXT.EVENTS.FLASH_ALL_BUTTON, flash_all_button_callback)
+CONTEXT.bind_root(CONTEXT.EVENTS.FLASH_RESUME_BUTTON, resume_batch_button_callback)
+CONTEXT.bind_root(CONTEXT.EVENTS.DONE_REFRESH, offer_resume_callback)
@@ -1,15 +1,37 @@
 from TelosAirSAMDBoardFlashGUI.context import CONTEXT
 # from TelosAirBoardManager.util.arduino import get_connected_boards
 from TelosAirSAMDBoardFlashGUI.util.bossa import get_connected_boards
-from TelosAirSAMDBoardFlashGUI.util.tkinter_threads import JobThread
+from TelosAirSAMDBoardFlashGUI.util.interrogate import identify_boards
+from TelosAirSAMDBoardFlashGUI.util.executor import ExecutorFull
+import logging
+
+logger = logging.getLogger("TelosAir")
+
+REFRESH_TASK_KEY = "refresh-devices"
+
+def _signal_refresh_done():
+    for event in [CONTEXT.EVENTS.DONE_REFRESH, CONTEXT.EVENTS.REDRAW_LISTBOX, CONTEXT.EVENTS.UNLOCK_REFRESH_BUTTON]:
+        CONTEXT.root.event_generate(event)
+
+def _get_connected_boards_and_firmware():
+    boards = get_connected_boards()
+    # Opening a port a flash job is about to touch (or is touching) can break its 1200-baud reset.
+    return identify_boards(boards, skip=CONTEXT.flashing_serials(boards))
 
 def refresh_button_callback(*args):
-    def _get_connected_boards_and_update_list():
-        boards = get_connected_boards()
+    def _on_done(boards):
         CONTEXT.board_list = boards
+        logger.debug(f"Refresh done. Executor: {CONTEXT.executor.stats()}")
+        _signal_refresh_done()
+
+    def _on_error(err):
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.UNLOCK_REFRESH_BUTTON)
 
-    th = JobThread([CONTEXT.EVENTS.DONE_REFRESH, CONTEXT.EVENTS.REDRAW_LISTBOX, CONTEXT.EVENTS.UNLOCK_REFRESH_BUTTON],
-                    _get_connected_boards_and_update_list)
-    th.start()
+    # Keyed, so presses while a refresh is already in flight just share its result.
+    try:
+        CONTEXT.executor.submit(_get_connected_boards_and_firmware, key=REFRESH_TASK_KEY, on_done=_on_done, on_error=_on_error)
+    except ExecutorFull as e:
+        logger.error(f"Not refreshing: {e}")
+        CONTEXT.root.event_generate(CONTEXT.EVENTS.UNLOCK_REFRESH_BUTTON)
 
-CONTEXT.bind_root(CONTEXT.EVENTS.REFRESH, refresh_button_callback)
\ No newline at end of file
+CONTEXT.bind_root(CONTEXT.EVENTS.REFRESH, refresh_button_callback)
@@ -1,6 +1,12 @@
 from tkinter import *
 from typing import Callable
 from TelosAirSAMDBoardFlashGUI.models.board import Board
+from TelosAirSAMDBoardFlashGUI.util.provision import Provisioner
+from TelosAirSAMDBoardFlashGUI.util.executor import TaskExecutor
+from TelosAirSAMDBoardFlashGUI.util.backup import ChunkStore
+from TelosAirSAMDBoardFlashGUI.util.assignment import AssignmentRule
+from TelosAirSAMDBoardFlashGUI.util.samba import VERIFY_FULL
+from TelosAirSAMDBoardFlashGUI.util.journal import BatchJournal
 import logging
 
 logger = logging.getLogger("TelosAir")
@@ -11,11 +17,28 @@ class Context(object):
 
     _to_bind: 'list[str, Callable]' = []
 
+    # All background work from the UI goes through here rather than a thread per action.
+    executor: TaskExecutor = TaskExecutor()
+    # Executor keys for flashing: one board is keyed `(FLASH_TASK_KEY, serial)`, a batch `FLASH_ALL_TASK_KEY`.
+    FLASH_TASK_KEY = "flash"
+    FLASH_ALL_TASK_KEY = "flash-all"
+
     board_list: 'list[Board]' = []
     board_selected: Board = None
 
     file_selected: int = None
 
+    # Set when a provisioning source is given; patches per-board config into each image flashed.
+    provisioner: Provisioner = None
+    # Set when a backup directory is given; each board's current firmware is saved here before flashing.
+    backup_store: ChunkStore = None
+    # Decide each board's image for "Flash All"; boards no rule matches get `file_selected`.
+    assignment_rules: 'list[AssignmentRule]' = []
+    # One of `util.samba.VERIFY_MODES`.
+    verify_mode: str = VERIFY_FULL
+    # Records batch progress so a batch interrupted by a crash can be resumed.
+    journal: BatchJournal = None
+
     class EVENTS(object):
         REFRESH = "<<refresh-devices-button>>"
         DONE_REFRESH = "<<refresh-devices-done>>"
@@ -29,6 +52,8 @@ class Context(object):
         BOARD_ACTION_BUTTON_DISABLE = "<<disable-actions>>"
 
         FLASH_BUTTON = "<<flash>>"
+        FLASH_ALL_BUTTON = "<<flash-all>>"
+        FLASH_RESUME_BUTTON = "<<flash-resume>>"
 
         BOARD_SELECT = "<<board-selected>>"
         FILE_SELECT = "<<file-selected>>"
@@ -36,9 +61,26 @@ class Context(object):
         CLEAR_INSPECT = "<<clear-inspect>>"
         CLEAR_DEVICES = "<<clear-devices>>"
 
+    def flash_pending(self) -> bool:
+        """
+        Whether a flash or batch flash is queued or running.
+        """
+        return any(key == self.FLASH_ALL_TASK_KEY or (isinstance(key, tuple) and key[0] == self.FLASH_TASK_KEY)
+                   for key in self.executor.pending_keys())
+
+    def flashing_serials(self, boards: 'list[Board]') -> 'set[str]':
+        """
+        Serials of `boards` a queued or running flash may be using: all of them during a batch.
+        """
+        keys = self.executor.pending_keys()
+        if self.FLASH_ALL_TASK_KEY in keys:
+            return {board.serial_number for board in boards}
+        return {key[1] for key in keys if isinstance(key, tuple) and key[0] == self.FLASH_TASK_KEY}
+
     def bind_root(self, signal: str, func: Callable):
+        # Added to, not replacing, any other handlers for the same event.
         if self.root:
-            self.root.bind(signal, func)
+            self.root.bind(signal, func, "+")
         else:
             self._to_bind.append((signal, func))
 
@@ -46,9 +88,10 @@ class Context(object):
         self.root = root
         self.client_name = client_name
         self.database_url = db_url
+        self.executor.attach(root)
         for item in self._to_bind:
             logger.debug(f"Binding Pre-Bound: {item}")
-            self.root.bind(*item)
+            self.root.bind(*item, "+")
 
 CONTEXT = Context()
 
@@ -1,6 +1,9 @@
 class Board(object):
-    def __init__(self, board_name: str, pid: str, sn: str, vid: str, port_address: str):
+    def __init__(self, board_name: str, pid: str, sn: str, vid: str, port_address: str, location: str = None, stable_path: str = None):
         self.port_path = port_address
+        self.location = location # USB bus/hub port path, e.g. "1-1.2:1.0"
+        self.stable_path = stable_path # Linux only: udev /dev/serial/by-path (or by-id) link to the port
+        self.firmware = None # Set by util.interrogate.identify_boards
         self.vid = vid
         self.pid = pid
         self.board_name = board_name
@@ -1,4 +1,6 @@
 from tkinter import *
+from tkinter import messagebox
+from TelosAirSAMDBoardFlashGUI.context import CONTEXT
 from TelosAirSAMDBoardFlashGUI.ui.widgets.window import MainWindow
 
 
@@ -13,4 +15,14 @@ class TelosAirApp(Tk):
         self.title("TelosAir QT-Py Flash Utility")
 
         mw = MainWindow(self)
-        mw.pack()
\ No newline at end of file
+        mw.pack()
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        if CONTEXT.flash_pending() and not messagebox.askyesno(self.title(),
+                "Boards are still being flashed. Quit anyway?\n\n"
+                "The board being flashed may be left in bootloader mode; an interrupted batch can be resumed next time."):
+            return
+        CONTEXT.executor.shutdown()
+        self.destroy()
\ No newline at end of file
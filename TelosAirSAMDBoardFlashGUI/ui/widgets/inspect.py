@@ -25,20 +25,24 @@ class BoardInfoFrame(Frame):
         self.board_name = BoardInfoEntry(self, "Board Type")
         self.board_path = BoardInfoEntry(self, "USB Conn.")
         self.board_sn = BoardInfoEntry(self, "Serial")
+        self.board_firmware = BoardInfoEntry(self, "Firmware")
 
         self.board_name.pack()
         self.board_path.pack()
         self.board_sn.pack()
+        self.board_firmware.pack()
 
     def update(self, board: Board):
         self.board_name.update_text(board.board_name)
-        self.board_path.update_text(board.port_path)
+        self.board_path.update_text(board.stable_path or board.port_path)
         self.board_sn.update_text(board.serial_number)
+        self.board_firmware.update_text(board.firmware or "")
 
     def clear(self):
         self.board_name.update_text("")
         self.board_path.update_text("")
         self.board_sn.update_text("")
+        self.board_firmware.update_text("")
 
 class CheckBootloaderButton(Button):
     def __init__(self, master):
@@ -49,24 +53,40 @@ class ActionButtonsFrame(Frame):
         super().__init__(master=master)
 
         self.flash_button = Button(self, text='Flash', command=event_generate_func_generator(CONTEXT.EVENTS.FLASH_BUTTON))
+        self.flash_all_button = Button(self, text='Flash All', command=event_generate_func_generator(CONTEXT.EVENTS.FLASH_ALL_BUTTON))
+        self.resume_button = Button(self, text='Resume Batch', command=event_generate_func_generator(CONTEXT.EVENTS.FLASH_RESUME_BUTTON))
         # self.check_bootloader_button = CheckBootloaderButton(self)
 
         self.flash_button.pack(fill=X)
+        self.flash_all_button.pack(fill=X)
+        self.resume_button.pack(fill=X)
         # self.check_bootloader_button.pack()
 
         CONTEXT.bind_root(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_ENABLE, self.enable)
+        CONTEXT.bind_root(CONTEXT.EVENTS.DONE_REFRESH, self.enable)
         # CONTEXT.bind_root(CONTEXT.EVENTS.BOARD_ACTION_BUTTON_DISABLE, self.disable)
         self.disable()
 
     def enable(self, *args):
+        # A refresh can finish mid-flash; don't offer to flash again until it's done.
+        if CONTEXT.flash_pending():
+            return
         # print([CONTEXT.board_selected, CONTEXT.file_selected])
         if not (None in [CONTEXT.board_selected, CONTEXT.file_selected]):
             for btn in [self.flash_button]:
                 btn: Button
                 btn.config(state='normal')
+        if CONTEXT.board_list and (CONTEXT.assignment_rules or CONTEXT.file_selected is not None):
+            self.flash_all_button.config(state='normal')
+        else:
+            self.flash_all_button.config(state='disabled')
+        if CONTEXT.journal and CONTEXT.journal.unfinished():
+            self.resume_button.config(state='normal')
+        else:
+            self.resume_button.config(state='disabled')
 
     def disable(self, *args):
-        for btn in [self.flash_button]:
+        for btn in [self.flash_button, self.flash_all_button, self.resume_button]:
             btn: Button
             btn.config(state='disabled')
 
@@ -0,0 +1,43 @@
+from tkinter import *
+from typing import Callable
+
+class PlanConfirmPopup(Toplevel):
+    """
+    Modal confirmation for a batch plan. The plan is shown one line per board in a scrolling list, so
+    it stays usable for hundreds of boards; `on_confirm` is called if the operator confirms.
+    """
+    def __init__(self, root: Tk, summary_text: str, lines: 'list[str]', on_confirm: Callable, window_title: str = ''):
+        super().__init__(master=root)
+        if window_title: self.title(window_title)
+        self.on_confirm = on_confirm
+
+        self.geometry("640x400")
+        self.minsize(400, 200)
+
+        summary_label = Label(self, text=summary_text, justify=LEFT, anchor='w')
+
+        list_frame = Frame(self)
+        scrollbar = Scrollbar(list_frame, orient=VERTICAL)
+        listbox = Listbox(list_frame, yscrollcommand=scrollbar.set, activestyle='none')
+        scrollbar.config(command=listbox.yview)
+        for line in lines:
+            listbox.insert(END, line)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        listbox.pack(side=LEFT, fill=BOTH, expand=True)
+
+        buttons = Frame(self)
+        Button(buttons, text='Cancel', command=self.destroy).pack(side=RIGHT, padx=5)
+        Button(buttons, text='Confirm', command=self.confirm).pack(side=RIGHT)
+
+        # Buttons packed before the list so they stay visible however small the window gets.
+        summary_label.pack(side=TOP, fill=X, padx=10, pady=(10, 5))
+        buttons.pack(side=BOTTOM, fill=X, padx=10, pady=10)
+        list_frame.pack(side=TOP, fill=BOTH, expand=True, padx=10)
+
+        self.bind("<Escape>", lambda *args: self.destroy())
+        self.transient(root)
+        self.grab_set()
+
+    def confirm(self, *args):
+        self.destroy()
+        self.on_confirm()
@@ -70,7 +70,7 @@ class DeviceList(Listbox):
         self.board_list = CONTEXT.board_list.copy()
 
         for i, port in enumerate(self.board_list):
-            self.insert(i, f"{port.board_name} [@ {port.port_path}]")
+            self.insert(i, f"{port.board_name} [@ {port.port_path}]" + (f" - {port.firmware}" if port.firmware else ""))
 
         if len(self.board_list) == 0 and self.redraws > 1:
             tkinter.messagebox.showwarning(title="Device List Refresh", message="No valid devices were found connected to your computer. Please connect the device and try again.")
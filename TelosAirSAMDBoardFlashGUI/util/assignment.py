@@ -0,0 +1,157 @@
+"""
+Rule-based firmware assignment for flashing every connected board in one batch.
+
+Rules are loaded from a JSON list and checked in order; the first rule that matches a board
+decides its image. Each rule names an image (a `DEVICE_FILE_NICKNAMES` entry, a bundled file
+name, or a path to a `.bin`) and one way of matching boards:
+
+    [
+        {"serials": ["4A1B2C3D...", "5E6F7A8B..."], "image": "PlantowerTestSketch.ino.bin"},
+        {"serial_prefix": "4A1B", "image": "QT Py - AlphaSense OPC-R2 Read"},
+        {"location": "1-1.2*", "image": "PlantowerTestSketch.ino.bin"},
+        {"manifest": "manifest.csv"}
+    ]
+
+`location` is matched (shell-style wildcards) against pyserial's USB location for the port, i.e.
+the hub port the board is plugged into. A `manifest` is a CSV with `serial,image` columns.
+"""
+from TelosAirSAMDBoardFlashGUI.models.board import Board
+from TelosAirSAMDBoardFlashGUI.util.files import DEVICE_FILE_NICKNAMES, DEVICE_FILE_PATHS
+from fnmatch import fnmatch
+from typing import Union
+import csv
+import json
+import os
+
+class AssignmentError(Exception):
+    pass
+
+def resolve_image(name: str, relative_to: str = None) -> str:
+    """
+    Turn an image reference from a rule into a path to flash.
+    """
+    if name in DEVICE_FILE_NICKNAMES:
+        return DEVICE_FILE_PATHS[DEVICE_FILE_NICKNAMES.index(name)]
+    for path in DEVICE_FILE_PATHS:
+        if os.path.basename(path) == name:
+            return path
+
+    path = os.path.join(relative_to, name) if relative_to and not os.path.isabs(name) else name
+    if not os.path.isfile(path):
+        raise AssignmentError(f"Unknown image {name!r}.")
+    return path
+
+class AssignmentRule(object):
+    def __init__(self, image: str):
+        self.image = image
+
+    def image_for(self, board: Board) -> Union[str, None]:
+        """
+        Image path for `board` if this rule matches it, otherwise `None`.
+        """
+        raise NotImplementedError
+
+class SerialListRule(AssignmentRule):
+    def __init__(self, serials: 'list[str]', image: str):
+        super().__init__(image)
+        self.serials = set(serials)
+
+    def image_for(self, board: Board) -> Union[str, None]:
+        return self.image if board.serial_number in self.serials else None
+
+    def __str__(self) -> str:
+        return f"serial in list of {len(self.serials)}"
+
+class SerialPrefixRule(AssignmentRule):
+    def __init__(self, prefix: str, image: str):
+        super().__init__(image)
+        self.prefix = prefix
+
+    def image_for(self, board: Board) -> Union[str, None]:
+        return self.image if (board.serial_number or "").startswith(self.prefix) else None
+
+    def __str__(self) -> str:
+        return f"serial prefix {self.prefix}"
+
+class LocationRule(AssignmentRule):
+    def __init__(self, pattern: str, image: str):
+        super().__init__(image)
+        self.pattern = pattern
+
+    def image_for(self, board: Board) -> Union[str, None]:
+        return self.image if board.location and fnmatch(board.location, self.pattern) else None
+
+    def __str__(self) -> str:
+        return f"USB location {self.pattern}"
+
+class ManifestRule(AssignmentRule):
+    def __init__(self, path: str):
+        super().__init__(None)
+        self.path = path
+        self.images: 'dict[str, str]' = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    self.images[row["serial"].strip()] = resolve_image(row["image"].strip(), os.path.dirname(path))
+                except KeyError as e:
+                    raise AssignmentError(f"Manifest {path} is missing column {e}.")
+
+    def image_for(self, board: Board) -> Union[str, None]:
+        return self.images.get(board.serial_number)
+
+    def __str__(self) -> str:
+        return f"manifest {os.path.basename(self.path)}"
+
+def load_rules(path: str) -> 'list[AssignmentRule]':
+    """
+    Load assignment rules from the JSON file at `path` (see module docs for the format).
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        entries = json.load(f)
+
+    rules = []
+    for entry in entries:
+        if "manifest" in entry:
+            rules.append(ManifestRule(os.path.join(base, entry["manifest"])))
+            continue
+
+        if "image" not in entry:
+            raise AssignmentError(f"Rule {entry} has no image.")
+        image = resolve_image(entry["image"], base)
+        if "serials" in entry:
+            rules.append(SerialListRule(entry["serials"], image))
+        elif "serial_prefix" in entry:
+            rules.append(SerialPrefixRule(entry["serial_prefix"], image))
+        elif "location" in entry:
+            rules.append(LocationRule(entry["location"], image))
+        else:
+            raise AssignmentError(f"Rule {entry} doesn't say which boards it matches.")
+    return rules
+
+class PlanEntry(object):
+    def __init__(self, board: Board, filepath: Union[str, None], reason: str, last_stage: str = None):
+        self.board = board
+        self.filepath = filepath
+        self.reason = reason
+        self.last_stage = last_stage # From the journal when resuming an interrupted batch
+
+    def __str__(self) -> str:
+        image = os.path.basename(self.filepath) if self.filepath else "(skip)"
+        return f"{self.board.serial_number} [@ {self.board.port_path}] -> {image} ({self.reason})"
+
+def resolve_plan(boards: 'list[Board]', rules: 'list[AssignmentRule]', default_image: str = None) -> 'list[PlanEntry]':
+    """
+    Pick an image for every board in one pass. The first matching rule wins; boards no rule
+    matches get `default_image`, or are skipped if that is `None`.
+    """
+    plan = []
+    for board in boards:
+        for rule in rules:
+            image = rule.image_for(board)
+            if image:
+                plan.append(PlanEntry(board, image, str(rule)))
+                break
+        else:
+            plan.append(PlanEntry(board, default_image, "selected image" if default_image else "no rule matched"))
+    return plan
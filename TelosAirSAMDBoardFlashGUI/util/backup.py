@@ -0,0 +1,230 @@
+"""
+Pre-flash firmware backups.
+
+Backups are split into content-defined chunks (a gear rolling hash picks the cut points, so
+identical runs of firmware produce identical chunks no matter where they sit) and each unique
+chunk is stored once under its SHA-256. A backup itself is just a small JSON manifest listing
+its chunks, kept per serial number and time:
+
+    <store>/chunks/ab/abcdef....        zlib-compressed chunk data
+    <store>/manifests/<serial>/<time>.json
+
+Since most boards carry one of a handful of images, each new backup usually adds only a manifest.
+
+Restore a backup to a board with:
+
+    python -m TelosAirSAMDBoardFlashGUI.util.backup <store> restore <serial> [--at TIME] [--to SERIAL]
+"""
+from datetime import datetime, timezone
+from hashlib import sha256
+from pathlib import Path
+from random import Random
+from typing import Union
+import argparse
+import json
+import os
+import tempfile
+import zlib
+
+import logging
+logger = logging.getLogger("Flash")
+
+# Chunk sizes in bytes. The average is set by the number of hash bits that must be zero.
+CHUNK_MIN = 2 * 1024
+CHUNK_AVG_BITS = 13 # ~8KB
+CHUNK_MAX = 32 * 1024
+
+_CHUNK_MASK = (1 << CHUNK_AVG_BITS) - 1
+# Fixed seed: cut points must be the same on every run or nothing would dedupe.
+_GEAR = [Random(0x7E105A1F ^ i).getrandbits(32) for i in range(256)]
+
+TIME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+def chunk_boundaries(data: bytes) -> 'list[int]':
+    """
+    Return the end offset of each content-defined chunk in `data`.
+    """
+    ends = []
+    start = 0
+    n = len(data)
+    gear = _GEAR
+    while start < n:
+        end = min(start + CHUNK_MAX, n)
+        h = 0
+        i = start + CHUNK_MIN
+        if i < end:
+            # Warm the hash over the minimum chunk so the first candidate cut sees a full window.
+            for b in data[i - 32:i]:
+                h = ((h << 1) + gear[b]) & 0xFFFFFFFF
+            while i < end:
+                h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+                i += 1
+                if not (h & _CHUNK_MASK):
+                    end = i
+                    break
+        ends.append(end)
+        start = end
+    return ends
+
+class BackupManifest(object):
+    def __init__(self, serial_number: str, taken_at: str, offset: int, size: int, digest: str, chunks: 'list[str]'):
+        self.serial_number = serial_number
+        self.taken_at = taken_at
+        self.offset = offset
+        self.size = size
+        self.digest = digest
+        self.chunks = chunks
+
+    def to_dict(self) -> dict:
+        return dict(serial_number=self.serial_number, taken_at=self.taken_at, offset=self.offset,
+                    size=self.size, sha256=self.digest, chunks=self.chunks)
+
+    @staticmethod
+    def from_dict(d: dict) -> 'BackupManifest':
+        return BackupManifest(d["serial_number"], d["taken_at"], d["offset"], d["size"], d["sha256"], d["chunks"])
+
+    def __repr__(self) -> str:
+        return f"<BackupManifest {self.serial_number} @ {self.taken_at} | {self.size} bytes, {len(self.chunks)} chunks>"
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+class ChunkStore(object):
+    """
+    Deduplicated store of firmware backups rooted at `path`.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.chunks_path = self.path / "chunks"
+        self.manifests_path = self.path / "manifests"
+        self.chunks_path.mkdir(parents=True, exist_ok=True)
+        self.manifests_path.mkdir(parents=True, exist_ok=True)
+
+    def _chunk_path(self, digest: str) -> Path:
+        return self.chunks_path / digest[:2] / digest
+
+    def put(self, serial_number: str, data: bytes, offset: int) -> BackupManifest:
+        """
+        Store `data`, read from flash at `offset` of board `serial_number`, and return its manifest.
+        """
+        chunks = []
+        new_bytes = 0
+        start = 0
+        for end in chunk_boundaries(data):
+            piece = data[start:end]
+            digest = sha256(piece).hexdigest()
+            cpath = self._chunk_path(digest)
+            if not cpath.exists():
+                blob = zlib.compress(piece)
+                _atomic_write(cpath, blob)
+                new_bytes += len(blob)
+            chunks.append(digest)
+            start = end
+
+        manifest = BackupManifest(
+            serial_number=serial_number,
+            taken_at=datetime.now(timezone.utc).strftime(TIME_FORMAT),
+            offset=offset,
+            size=len(data),
+            digest=sha256(data).hexdigest(),
+            chunks=chunks
+        )
+        _atomic_write(self.manifests_path / serial_number / f"{manifest.taken_at}.json",
+                      json.dumps(manifest.to_dict()).encode())
+        logger.info(f"Backed up {serial_number}: {len(data)} bytes in {len(chunks)} chunks, {new_bytes} new bytes stored.")
+        return manifest
+
+    def list(self, serial_number: str = None) -> 'list[BackupManifest]':
+        """
+        All manifests, oldest first, optionally only for `serial_number`.
+        """
+        dirs = [self.manifests_path / serial_number] if serial_number else sorted(self.manifests_path.iterdir())
+        ret = []
+        for d in dirs:
+            if not d.is_dir():
+                continue
+            for p in sorted(d.glob("*.json")):
+                with open(p) as f:
+                    ret.append(BackupManifest.from_dict(json.load(f)))
+        return ret
+
+    def find(self, serial_number: str, taken_at: str = None) -> Union[BackupManifest, None]:
+        """
+        The latest backup for `serial_number` taken at or before `taken_at` (any prefix of
+        `TIME_FORMAT`, e.g. `20260101`), or the latest overall if not given.
+        """
+        manifests = self.list(serial_number)
+        if taken_at:
+            manifests = [m for m in manifests if m.taken_at[:len(taken_at)] <= taken_at]
+        return manifests[-1] if manifests else None
+
+    def read(self, manifest: BackupManifest) -> bytes:
+        data = b"".join(zlib.decompress(self._chunk_path(d).read_bytes()) for d in manifest.chunks)
+        if sha256(data).hexdigest() != manifest.digest:
+            raise ValueError(f"Backup {manifest} is corrupt (digest mismatch).")
+        return data
+
+def restore(store: ChunkStore, serial_number: str, taken_at: str = None, target_serial: str = None) -> bool:
+    """
+    Flash the backup of `serial_number` (see `ChunkStore.find`) onto the connected board with
+    serial `target_serial` (defaults to the same board). Returns success as `bool`.
+    """
+    from TelosAirSAMDBoardFlashGUI.util.bossa import FlashJob, find_connected_board, APP_REGION_OFFSET
+
+    manifest = store.find(serial_number, taken_at)
+    if manifest is None:
+        logger.error(f"No backup found for {serial_number}.")
+        return False
+    if manifest.offset != APP_REGION_OFFSET:
+        logger.error(f"Backup {manifest} was not taken at 0x{APP_REGION_OFFSET:X}, can't restore it.")
+        return False
+
+    board = find_connected_board(target_serial or serial_number)
+    if board is None:
+        logger.error(f"Board {target_serial or serial_number} is not connected.")
+        return False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, f"{serial_number}-{manifest.taken_at}.bin")
+        with open(image_path, "wb") as f:
+            f.write(store.read(manifest))
+
+        logger.info(f"Restoring {manifest} to {board}.")
+        job = FlashJob(board=board, filepath=image_path)
+        job.run()
+
+    ok = True
+    while not job.updates_queue.empty():
+        msg, ok, _ = job.updates_queue.get()
+        logger.info(msg)
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m TelosAirSAMDBoardFlashGUI.util.backup")
+    parser.add_argument("store", help="Backup store directory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List backups.")
+    list_parser.add_argument("serial", nargs="?", default=None)
+    restore_parser = sub.add_parser("restore", help="Flash a backup back onto a board.")
+    restore_parser.add_argument("serial", help="Serial number the backup was taken from.")
+    restore_parser.add_argument("--at", default=None, help="Use the latest backup taken at or before this time (e.g. 20260101T1200).")
+    restore_parser.add_argument("--to", default=None, help="Serial number of the board to restore to, if not the same one.")
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store)
+    if args.command == "list":
+        for m in store.list(args.serial):
+            print(m)
+        return 0
+    return 0 if restore(store, args.serial, args.at, args.to) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,14 @@
 from TelosAirSAMDBoardFlashGUI.models.board import Board
+from TelosAirSAMDBoardFlashGUI.util.provision import Provisioner, ProvisioningError
+from TelosAirSAMDBoardFlashGUI.util.backup import ChunkStore
+from TelosAirSAMDBoardFlashGUI.util.samba import VERIFY_FULL, VERIFY_CRC, verify_and_reset, verify_segments_and_reset
+from TelosAirSAMDBoardFlashGUI.util.image import ImageLayout, analyse_image
+from TelosAirSAMDBoardFlashGUI.util.journal import STAGE_PROVISIONING, STAGE_BOOTLOADER, STAGE_BACKUP, STAGE_WRITING, \
+    STAGE_DONE, STAGE_FAILED, MID_WRITE_STAGES, JournalEntry, BatchJournal
 from pathlib import Path
-from threading import Thread
+from threading import Thread, Lock
 from pathlib import Path
-from typing import Union, Tuple
+from typing import Union, Tuple, Callable
 from serial import Serial, SerialTimeoutException
 from queue import Queue
 from serial.tools.list_ports import comports as list_comports
@@ -11,6 +17,7 @@ import sys
 from time import time, sleep
 from platform import system
 import subprocess
+import tempfile
 
 prepend_err_msg = lambda msg, err: Exception(str(msg)+str(err.args[0]), *err.args[1:])
 
@@ -26,6 +33,9 @@ logger.setLevel(logging.DEBUG)
 
 OS_NAME = system()
 
+if OS_NAME == 'Linux':
+    from TelosAirSAMDBoardFlashGUI.util import linux
+
 # Determine if running as a bundled application or in a normal Python environment
 if getattr(sys, 'frozen', False):
     # If the application is run as a bundle, the PyInstaller bootloader
@@ -45,17 +55,49 @@ Valid VID:PID combos for QT Py. For some reason, when the QT Py is put in bootlo
 the PID changes to match the second combo here.
 """
 VALID_VID_PID = [(0x80CB,0x239A), (0x00CB,0x239A)]
+BOOTLOADER_PID_VID = (0x00CB,0x239A)
+
+# SAMD21E18 (QT Py): 256KB flash, the first 8KB of which is the UF2 bootloader.
+APP_REGION_OFFSET = 0x2000
+FLASH_SIZE = 0x40000
+APP_REGION_SIZE = FLASH_SIZE - APP_REGION_OFFSET
+
+def _stable_path(device: str) -> Union[str, None]:
+    return linux.stable_link(device) if OS_NAME == 'Linux' else None
 
-def find_connected_board(board_serial: str) -> Union[Board, None]:
+_port_locks: 'dict[str, Lock]' = {}
+_port_locks_lock = Lock()
+
+def board_port_lock(serial_number: str) -> Lock:
+    """
+    Lock held by whatever has the board with `serial_number`'s port open (a `FlashJob` or a
+    firmware probe); Windows only lets one of them open it at a time.
+    """
+    with _port_locks_lock:
+        return _port_locks.setdefault(serial_number, Lock())
+
+def board_device_path(board: Board) -> str:
+    """
+    The path to open/pass to `bossac` for `board`. On Linux this is the udev link for its USB
+    port when there is one, so it stays valid when the board re-enumerates.
+    """
+    if OS_NAME == 'Windows':
+        return board.port_path
+    if OS_NAME == 'Linux' and board.stable_path:
+        return board.stable_path
+    return "/dev/" + board.port_path
+
+def find_connected_board(board_serial: str, pid_vid: Tuple[int, int] = None) -> Union[Board, None]:
     """
     Check the computers USB connections to QT Py's and try to match the given
-    `board_serial` to it.
+    `board_serial` to it. With `pid_vid` (e.g. `BOOTLOADER_PID_VID`), only ports enumerated
+    with that PID:VID match.
     
     Return a new `Board` if found, `None` otherwise
     """
     for port in list_comports():
         # First match PID:VID known for QT Py
-        if (port.pid, port.vid) in VALID_VID_PID:
+        if (port.pid, port.vid) in ([pid_vid] if pid_vid else VALID_VID_PID):
             # Then match serial
             if board_serial == port.serial_number:
                 return Board(
@@ -63,7 +105,9 @@ def find_connected_board(board_serial: str) -> Union[Board, None]:
                     pid=port.pid,
                     sn=port.serial_number,
                     vid=port.vid,
-                    port_address=port.name
+                    port_address=port.name,
+                    location=port.location,
+                    stable_path=_stable_path(port.device)
                 )
 
 def get_connected_boards(port_path_only: bool = False) -> Union['list[Board]', 'list[str]']:
@@ -85,7 +129,9 @@ def get_connected_boards(port_path_only: bool = False) -> Union['list[Board]', '
                         pid=port.pid,
                         sn=port.serial_number,
                         vid=port.vid,
-                        port_address=port.name
+                        port_address=port.name,
+                        location=port.location,
+                        stable_path=_stable_path(port.device)
                     ))
     return ret
 
@@ -105,7 +151,7 @@ def _do_soft_request_bootloader_mode(path: str) -> None:
         if s:
             s.close()
 
-if OS_NAME in ['Darwin', 'Linux']:
+if OS_NAME in ['Darwin']:
     __get_drives = lambda: os.listdir("/Volumes/")
 elif OS_NAME in ['Windows']:
     import win32api
@@ -164,17 +210,70 @@ def _verify_bootloader_mode_set(timeout: float = 5) -> bool:
     return False
 
 
-def soft_request_bootloader_mode(device_path: str) -> bool:
+def _is_bootloader_port(device: str) -> bool:
+    device = os.path.realpath(device)
+    return any(port.device == device and (port.pid, port.vid) == BOOTLOADER_PID_VID for port in list_comports())
+
+def _soft_request_bootloader_mode_linux(device_path: str, board_serial: str = None, timeout: float = 5) -> bool:
+    """
+    Linux hosts are often headless with nothing auto-mounting `QTPY_BOOT`, so instead wait for
+    the port at `device_path` (ideally a `/dev/serial/by-path` link) to come back with the
+    bootloader's PID. Without a udev link `device_path` is the raw `/dev/ttyACMn`, and the
+    bootloader may come back on another node, so `board_serial` is also looked for.
+    """
+    in_bootloader = lambda: _is_bootloader_port(device_path) \
+        or (board_serial and find_connected_board(board_serial, BOOTLOADER_PID_VID) is not None)
+    if in_bootloader():
+        return True
+
+    logger.info("Attempting to put device in bootloader mode.")
+    _do_soft_request_bootloader_mode(device_path)
+
+    logger.info("Waiting for bootloader port.")
+    timeout_at = time() + timeout
+    while time() < timeout_at:
+        if in_bootloader():
+            logger.debug(f"{device_path} ({board_serial}) is in bootloader mode.")
+            return True
+        sleep(.2)
+
+    logger.error(f"{device_path} did not come back in bootloader mode.")
+    return False
+
+def _wait_for_bootloader_board(board_serial: str, timeout: float = 5) -> Union[Board, None]:
+    """
+    Wait for the board with `board_serial` to show up with the bootloader's PID:VID.
+    """
+    timeout_at = time() + timeout
+    while True:
+        board = find_connected_board(board_serial, BOOTLOADER_PID_VID)
+        if board or time() >= timeout_at:
+            return board
+        sleep(.2)
+
+def soft_request_bootloader_mode(device_path: str, board_serial: str = None) -> bool:
     """
     Perform a software request to the SAMD21 chip to enter bootloader mode.
 
+    With `board_serial`, success means that board's own port is in bootloader mode; a
+    `QTPY_BOOT` volume alone could belong to another board left in its bootloader.
+
     Will rethrow exceptions caught.
 
     Returns success as `bool`.
     """
+    if OS_NAME == 'Linux':
+        try:
+            return _soft_request_bootloader_mode_linux(device_path, board_serial)
+        except Exception as e:
+            raise(prepend_err_msg("<Verifying Bootloader Mode Set>: ", e))
 
     try:
-        if not _verify_bootloader_mode_set(timeout=.1):
+        if board_serial:
+            in_bootloader = find_connected_board(board_serial, BOOTLOADER_PID_VID) is not None
+        else:
+            in_bootloader = _verify_bootloader_mode_set(timeout=.1)
+        if not in_bootloader:
             logger.info("Attempting to put device in bootloader mode.")
             _do_soft_request_bootloader_mode(device_path)
     except Exception as e:
@@ -184,43 +283,120 @@ def soft_request_bootloader_mode(device_path: str) -> bool:
     if not _verify_bootloader_mode_set():
         logger.error("Device drive not mounted - looks like bootloader mode has not been set.")
         return False
+    if board_serial and not _wait_for_bootloader_board(board_serial):
+        logger.error(f"{board_serial} did not come back in bootloader mode.")
+        return False
     return True
 
 if OS_NAME == 'Darwin':
-    # CMD_TEMPLATE = f"\"{BOSSAC_BIN_PATH_MAC_OS}\" -i -d --port=%s -U -i --offset=0x2000 -w -v \"%s\" -R"
-    _format_term_cmd = lambda port, filepath: [f"\"{BOSSAC_BIN_PATH_MAC_OS}\" -i -d --port={port} -U -i --offset=0x2000 -w -v \"{filepath}\" -R"]
+    BOSSAC_BIN_PATH = BOSSAC_BIN_PATH_MAC_OS
 elif OS_NAME == 'Windows':
-    # CMD_TEMPLATE = f"{BOSSAC_BIN_PATH_WINDOWS} -i -d --port=%s -U -i --offset=0x2000 -w -v %s -R"
-    _format_term_cmd = lambda port, filepath: f'"{BOSSAC_BIN_PATH_WINDOWS}" -i -d --port={port} -U -i --offset=0x2000 -w -v "{filepath}" -R'
-    # _format_term_cmd = lambda c: [c]
+    BOSSAC_BIN_PATH = BOSSAC_BIN_PATH_WINDOWS
+elif OS_NAME == 'Linux':
+    BOSSAC_BIN_PATH = linux.find_bossac(BOSSAC_BIN_PATH_MAC_OS)
+else:
+    BOSSAC_BIN_PATH = None
 
-def flash_samd21_device(device_path: str, full_file_path: str) -> bool:
+# Commands are argument lists run without a shell, so paths with spaces/quotes need no escaping.
+def _format_term_cmd(port: str, filepath: str, verify: bool = True, offset: int = APP_REGION_OFFSET,
+                     erase: bool = False, reset: bool = None) -> 'list[str]':
+    """
+    `bossac` write command. Without `verify`, bossac neither reads back nor (by default) resets, so
+    the board stays in the bootloader for `samba.verify_and_reset`. With `erase`, flash is erased from
+    `offset` to the end first.
+    """
+    reset = verify if reset is None else reset
+    return [BOSSAC_BIN_PATH, "-i", "-d", f"--port={port}", "-U", "-i", f"--offset=0x{offset:X}"] \
+        + (["-e"] if erase else []) + ["-w"] + (["-v"] if verify else []) + [filepath] + (["-R"] if reset else [])
+
+_format_read_cmd = lambda port, filepath, size: [BOSSAC_BIN_PATH, "-d", f"--port={port}", "-U", "--offset=0x2000", f"--read={size}", filepath]
+
+def _run_bossac(cmd: 'list[str]') -> bool:
+    logger.debug(f"Running command {cmd}.")
+    res = subprocess.run(cmd, capture_output=True)
+    logger.debug(f"Flashing process results: Return Code: {res.returncode}, Std. Err.: {res.stderr}.")
+    return not res.returncode
+
+def flash_samd21_device(device_path: str, full_file_path: str, verify_mode: str = VERIFY_FULL, layout: ImageLayout = None) -> bool:
     """
     Flash the board at the given `device_path` using the BOSSA tool, `bossac`. 
     The file flashed will be the one given by `full_file_path`.
 
-    Returns success (measured by a zero `returncode`) as a `bool`.
+    With `verify_mode` `VERIFY_FULL`, `bossac -v` verifies the write itself. Otherwise the write is
+    checked with `samba.verify_and_reset` (bootloader CRC, or sampled pages if asked for).
+
+    If `layout` (from `util.image.analyse_image`) leaves out blank pages, the region is erased by the
+    first write and only the layout's segments are written and verified.
 
-    Depends on implementations per OS of:
+    Returns success (measured by a zero `returncode` and a passing verify) as a `bool`.
 
-    * CMD_TEMPLATE (`str`): The execute command template, intended for `cmd` (Windows) or `Terminal` (OS X),
-    that takes, in order, the `device_path` `str` parameter and the `full_file_path` `str` parameter.
+    Depends on `BOSSAC_BIN_PATH` being set for the OS.
+    """
+    logger.debug(f"flash_samd21({device_path}, {full_file_path}, {verify_mode}, {layout}).")
+    full_verify = verify_mode == VERIFY_FULL
+    start = time()
+
+    if layout is None or not layout.segments or not layout.is_trimmed:
+        ok = _run_bossac(_format_term_cmd(device_path, full_file_path, verify=full_verify))
+        logger.info(f"bossac {'write+verify' if full_verify else 'write'} took {time() - start:.2f}s.")
+        if not ok or full_verify:
+            return ok
+        verify = lambda: verify_and_reset(device_path, APP_REGION_OFFSET, full_file_path, verify_mode)
+    else:
+        with open(full_file_path, "rb") as f:
+            data = f.read()
+        segments = [(APP_REGION_OFFSET + offset, data[offset:offset + length]) for offset, length in layout.segments]
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, (addr, seg) in enumerate(segments):
+                seg_path = os.path.join(tmp, f"segment{i}.bin")
+                with open(seg_path, "wb") as f:
+                    f.write(seg)
+                is_last = i == len(segments) - 1
+                if not _run_bossac(_format_term_cmd(device_path, seg_path, verify=full_verify, offset=addr,
+                                                    erase=(i == 0), reset=(full_verify and is_last))):
+                    return False
+        logger.info(f"bossac {'write+verify' if full_verify else 'write'} of {layout.write_bytes}/{layout.size} bytes "
+                    f"in {len(segments)} segments took {time() - start:.2f}s.")
+        if full_verify:
+            return True
+        verify = lambda: verify_segments_and_reset(device_path, segments, verify_mode)
+
+    start = time()
+    ok = verify()
+    logger.info(f"{verify_mode} verify {'passed' if ok else 'FAILED'} in {time() - start:.2f}s.")
+    return ok
 
-    * _format_term_cmd ('lambda`): Format a string representation of a command to run in `list` format for use with `subprocess.run`
+def read_samd21_app_region(device_path: str, full_file_path: str, size: int = APP_REGION_SIZE) -> bool:
+    """
+    Read `size` bytes of the application region (starting at `APP_REGION_OFFSET`) of the board at
+    `device_path`, which must already be in bootloader mode, into `full_file_path` using `bossac`.
+    The board is left in bootloader mode.
+
+    Returns success (measured by a zero `returncode`) as a `bool`.
     """
-    logger.debug(f"flash_samd21({device_path}, {full_file_path}).")
-    cmd = _format_term_cmd(device_path, full_file_path)
+    logger.debug(f"read_samd21_app_region({device_path}, {full_file_path}, {size}).")
+    cmd = _format_read_cmd(device_path, full_file_path, size)
     logger.debug(f"Running command {cmd}.")
-    res = subprocess.run(cmd, capture_output=True, shell=True)
-    logger.debug(f"Flashing process results: Return Code: {res.returncode}, Std. Err.: {res.stderr}.")
+    res = subprocess.run(cmd, capture_output=True)
+    logger.debug(f"Read process results: Return Code: {res.returncode}, Std. Err.: {res.stderr}.")
     return not res.returncode
 
 #TODO: Improve error catching and reporting
-class FlashThread(Thread):
-    def __init__(self, board: Board, filepath: str,  updates_queue: Queue = None):
-        super().__init__(daemon=True)
+class FlashJob(object):
+    """
+    Flash one board. `run` blocks until done and reports progress on `updates_queue`
+    as `(msg, ok, done)` tuples; submit it to `CONTEXT.executor` rather than running it
+    on the Tk thread.
+    """
+    def __init__(self, board: Board, filepath: str,  updates_queue: Queue = None, provisioner: Provisioner = None,
+                 backup_store: ChunkStore = None, verify_mode: str = VERIFY_FULL, on_stage: Callable = None):
         self.dev = board
         self.filepath = filepath
+        self.provisioner = provisioner
+        self.backup_store = backup_store
+        self.verify_mode = verify_mode
+        # Called with each `util.journal` STAGE_* as the job reaches it.
+        self.on_stage = on_stage or (lambda stage: None)
 
         self.result = None
 
@@ -239,15 +415,70 @@ class FlashThread(Thread):
 
         return
 
+    def backup(self, dev_path: str) -> bool:
+        """
+        Read back the application region of the board (already in bootloader mode) into `backup_store`.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            dump_path = os.path.join(tmp, "backup.bin")
+            if not read_samd21_app_region(dev_path, dump_path):
+                return False
+            with open(dump_path, "rb") as f:
+                data = f.read()
+        if len(data) != APP_REGION_SIZE:
+            logger.error(f"Backup read {len(data)} bytes, expected {APP_REGION_SIZE}.")
+            return False
+        self.backup_store.put(self.dev.serial_number, data, APP_REGION_OFFSET)
+        return True
+
     def run(self):
-        dev_path = self.dev.port_path
-        if OS_NAME != "Windows":
-            dev_path = "/dev/"+dev_path
-        logger.debug(f"Thread has dev_path: {dev_path}, file: {self.filepath}")
+        base_path = self.filepath
+        try:
+            # Waits out a firmware probe of this board if a refresh is running.
+            with board_port_lock(self.dev.serial_number):
+                self._run()
+        finally:
+            # Provisioned images are one file per board; don't leave them piling up in the temp dir.
+            if self.provisioner and self.filepath != base_path:
+                self.provisioner.release(base_path, self.filepath)
+                self.filepath = base_path
+
+    def _run(self):
+        dev_path = board_device_path(self.dev)
+        logger.debug(f"Job has dev_path: {dev_path}, file: {self.filepath}")
+
+        if not BOSSAC_BIN_PATH:
+            logger.error(f"No bossac binary available on {OS_NAME}.")
+            self.updates_queue.put(("bossac was not found. Please install BOSSA (e.g. the bossa-cli package).", False, False))
+            return
+        if OS_NAME == 'Linux':
+            try:
+                linux.check_port_access(dev_path)
+            except PermissionError as e:
+                logger.error(str(e))
+                self.updates_queue.put((str(e), False, False))
+                return
+
+        # Patch the per-board config block in before touching the board so a missing record
+        # doesn't leave it sitting in bootloader mode.
+        if self.provisioner:
+            self.on_stage(STAGE_PROVISIONING)
+            self.updates_queue.put(('Generating provisioning image...', True, False))
+            try:
+                self.filepath = self.provisioner.provision(self.filepath, self.dev.serial_number)
+            except ProvisioningError as e:
+                logger.error(f"Provisioning failed for {self.dev.serial_number}: {e}")
+                self.updates_queue.put((f"Provisioning failed. {e}", False, False))
+                return
+            except Exception as e:
+                logger.exception(f"Provisioning failed with exception: {e}")
+                self.updates_queue.put(('Provisioning failed. (Exception)', False, False))
+                return
         
+        self.on_stage(STAGE_BOOTLOADER)
         self.updates_queue.put(('Putting board in bootloader mode...', True, False))
         try:
-            res = soft_request_bootloader_mode(dev_path)
+            res = soft_request_bootloader_mode(dev_path, self.dev.serial_number)
         except Exception as e:
             logger.exception(f"Exception during soft_request_bootloader_mode({dev_path}): {e}")
             self.updates_queue.put(("Failed to put the board in bootloader mode. (Exception).", False, False))
@@ -259,27 +490,50 @@ class FlashThread(Thread):
             return
         
         # Sometimes, especially on Windows/Linux, if the board disconnects, it might change connection path.
-        # So we must try to locate it.
-        connected_boards_paths = get_connected_boards(True)
-        logger.debug(f"After bootloader mode, connected boards at: {connected_boards_paths}")
-        if dev_path not in connected_boards_paths:
-            logger.info(f"Port path must have changed (Expecting {dev_path}). Searching for new.")
-
-            new_board = find_connected_board(board_serial=self.dev.serial_number)
-            if not new_board:
-                logger.error(f"Failed to locate new board connection for serial {self.dev.serial_number}")
-                self.updates_queue.put(('Failed to locate board after putting in bootloader mode. Please try again.', False, False))
+        # So we must try to locate it, by serial and bootloader PID so bossac never gets another board's port
+        # (or this board's application port).
+        # A Linux udev link already follows the board, it just needs to point at the bootloader port.
+        new_board = find_connected_board(self.dev.serial_number, BOOTLOADER_PID_VID)
+        if not new_board:
+            logger.error(f"Failed to locate bootloader connection for serial {self.dev.serial_number}")
+            self.updates_queue.put(('Failed to locate board after putting in bootloader mode. Please try again.', False, False))
+            return
+        new_path = board_device_path(new_board)
+        if os.path.realpath(new_path) != os.path.realpath(dev_path):
+            logger.info(f"Port path changed (Expecting {dev_path}), bootloader is at {new_path}.")
+        self.dev = new_board
+        dev_path = new_path
+
+        if self.backup_store:
+            self.on_stage(STAGE_BACKUP)
+            self.updates_queue.put(('Backing up current firmware...', True, False))
+            try:
+                res = self.backup(dev_path)
+            except Exception as e:
+                logger.exception(f"Backup failed with exception: {e}")
+                self.updates_queue.put(('Backing up current firmware failed. (Exception)', False, False))
+                return
+            if not res:
+                logger.error("Backup failed, not flashing.")
+                self.updates_queue.put(('Something went wrong. Backing up current firmware failed.', False, False))
                 return
-            else:
-                logger.info(f"New path detected for board is {new_board.port_path}")
-                self.dev = new_board
-                dev_path = self.dev.port_path
-                if OS_NAME != "Windows":
-                    dev_path = "/dev/"+dev_path
 
-        self.updates_queue.put(('Flashing Board...', True, False))
         try:
-            res = flash_samd21_device(dev_path, self.filepath)
+            with open(self.filepath, "rb") as f:
+                layout = analyse_image(f.read())
+        except Exception as e:
+            logger.exception(f"Reading image failed with exception: {e}")
+            self.updates_queue.put(('Flashing failed. Could not read the image. (Exception)', False, False))
+            return
+        logger.debug(f"{self.filepath}: {layout}")
+
+        self.on_stage(STAGE_WRITING)
+        if layout.is_trimmed:
+            self.updates_queue.put((f'Flashing Board... ({layout.write_bytes:,} of {layout.size:,} bytes)', True, False))
+        else:
+            self.updates_queue.put((f'Flashing Board... ({layout.size:,} bytes)', True, False))
+        try:
+            res = flash_samd21_device(dev_path, self.filepath, self.verify_mode, layout)
         except Exception as e:
             logger.exception(f"Flashing failed with exception: {e}")
             self.updates_queue.put(('Flashing failed. (Exception)', False, False))
@@ -290,4 +544,110 @@ class FlashThread(Thread):
             return
 
         self.updates_queue.put(('Board flash successful.', True, True))
-        
\ No newline at end of file
+
+class _BatchUpdatesRelay(object):
+    """
+    Stands in for a `FlashJob`'s `updates_queue`, forwarding its messages to the batch's queue
+    tagged with the board so one popup can follow the whole batch.
+    """
+    def __init__(self, target: Queue, prefix: str):
+        self.target = target
+        self.prefix = prefix
+        self.ok = False
+
+    def put(self, msg):
+        msg_text, is_ok, is_done = msg
+        self.ok = is_ok and is_done
+        self.target.put((f"{self.prefix} {msg_text}", True, False))
+
+class BatchFlashJob(object):
+    """
+    Flash a resolved assignment plan (`util.assignment.resolve_plan`) one board at a time.
+    Boards with no image in the plan are skipped. Reports progress and a final summary on
+    `updates_queue` like `FlashJob`.
+
+    With a `journal`, the plan and every board's stages are recorded so an interrupted batch
+    can be resumed: pass the interrupted `batch_id` and a plan whose entries carry their
+    journaled `last_stage`. Boards that finished are skipped and boards left mid-write are
+    checked against their image before deciding whether to flash them again.
+    """
+    def __init__(self, plan: list, updates_queue: Queue = None, provisioner: Provisioner = None,
+                 backup_store: ChunkStore = None, verify_mode: str = VERIFY_FULL,
+                 journal: BatchJournal = None, batch_id: str = None):
+        self.plan = plan
+        self.updates_queue = updates_queue or Queue()
+        self.provisioner = provisioner
+        self.backup_store = backup_store
+        self.verify_mode = verify_mode
+        self.journal = journal
+        self.batch_id = batch_id
+        self.results: 'dict[str, bool]' = {}
+
+    def _record(self, serial_number: str, stage: str):
+        if self.journal:
+            self.journal.record_stage(self.batch_id, serial_number, stage)
+
+    def recheck(self, entry) -> bool:
+        """
+        Whether a board left mid-write already holds its image, in which case it is reset into it.
+        Only boards still in the bootloader are checked; one running an application is reflashed.
+        """
+        if (entry.board.pid, entry.board.vid) != BOOTLOADER_PID_VID:
+            logger.info(f"{entry.board.serial_number} isn't in bootloader mode, skipping re-check.")
+            return False
+        path = entry.filepath
+        try:
+            if self.provisioner:
+                path = self.provisioner.provision(path, entry.board.serial_number)
+            with board_port_lock(entry.board.serial_number):
+                return verify_and_reset(board_device_path(entry.board), APP_REGION_OFFSET, path, VERIFY_CRC)
+        except Exception as e:
+            logger.info(f"Re-check of {entry.board.serial_number} failed, reflashing: {e}")
+            return False
+        finally:
+            if path != entry.filepath:
+                self.provisioner.release(entry.filepath, path)
+
+    def run(self):
+        todo = [entry for entry in self.plan if entry.filepath and entry.last_stage != STAGE_DONE]
+        if self.journal and not self.batch_id:
+            self.batch_id = self.journal.begin_batch(
+                [JournalEntry(e.board.serial_number, e.filepath, e.board.location) for e in todo])
+
+        start = time()
+        for i, entry in enumerate(todo):
+            serial_number = entry.board.serial_number
+            prefix = f"[{i+1}/{len(todo)}] {serial_number}:"
+
+            if entry.last_stage in MID_WRITE_STAGES:
+                self.updates_queue.put((f"{prefix} Re-checking interrupted write...", True, False))
+                if self.recheck(entry):
+                    logger.info(f"Batch: {serial_number} already holds {entry.filepath}.")
+                    self.results[serial_number] = True
+                    self._record(serial_number, STAGE_DONE)
+                    continue
+
+            relay = _BatchUpdatesRelay(self.updates_queue, prefix)
+            job = FlashJob(board=entry.board, filepath=entry.filepath, updates_queue=relay,
+                           provisioner=self.provisioner, backup_store=self.backup_store, verify_mode=self.verify_mode,
+                           on_stage=lambda stage, sn=serial_number: self._record(sn, stage))
+            job.run()
+            self.results[serial_number] = relay.ok
+            self._record(serial_number, STAGE_DONE if relay.ok else STAGE_FAILED)
+            logger.info(f"Batch: {serial_number} <- {entry.filepath}: {'ok' if relay.ok else 'FAILED'}")
+
+        if self.journal:
+            # Boards that failed, or were skipped because they weren't connected, keep the batch open for a later resume.
+            batch = self.journal.unfinished()
+            left = [e for e in batch.entries if e.stage != STAGE_DONE] if batch and batch.batch_id == self.batch_id else []
+            if left:
+                logger.info(f"Batch {self.batch_id} left open: {len(left)} boards unfinished.")
+            else:
+                self.journal.end_batch(self.batch_id)
+
+        failed = [sn for sn, ok in self.results.items() if not ok]
+        logger.info(f"Batch of {len(todo)} done in {time() - start:.1f}s, {len(failed)} failed.")
+        if failed:
+            self.updates_queue.put((f"{len(todo) - len(failed)} of {len(todo)} boards flashed. Failed: {', '.join(failed)}", False, False))
+        else:
+            self.updates_queue.put((f"All {len(todo)} boards flashed successfully.", True, True))
@@ -0,0 +1,156 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable
+from tkinter import Tk
+
+import logging
+logger = logging.getLogger("TelosAir")
+
+class ExecutorFull(Exception):
+    pass
+
+class TaskExecutor(object):
+    """
+    Application-wide, bounded pool for background work started from the UI.
+
+    * At most `max_workers` tasks run at once and at most `max_queued` more may wait; `submit`
+      raises `ExecutorFull` past that instead of piling up threads.
+    * Tasks submitted with a `key` are de-duplicated: while one with that key is pending or
+      running, submitting again returns the existing `Future` without queueing a new task.
+    * `on_done`/`on_error` are run on the Tk thread (drained from a queue with `root.after`),
+      so they may touch widgets directly.
+    """
+    POLL_MS = 50
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 32):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="TelosAirWorker")
+        self._lock = Lock()
+        self._keyed: 'dict[Hashable, Future]' = {}
+        self._callbacks: Queue = Queue()
+        self._root: Tk = None
+
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.
+        self._total_run = 0.
+        self._last_latency = 0.
+
+    def attach(self, root: Tk):
+        """
+        Start delivering callbacks on `root`'s thread. Callbacks from tasks that finish
+        before this is called are held until then.
+        """
+        self._root = root
+        self._root.after(self.POLL_MS, self._drain_callbacks)
+
+    def submit(self, func: Callable, *args, key: Hashable = None,
+               on_done: Callable = None, on_error: Callable = None, **kwargs) -> Future:
+        """
+        Queue `func(*args, **kwargs)`. `on_done(result)` or `on_error(exception)` is called on
+        the Tk thread afterwards. Uncaught exceptions are always logged.
+        """
+        with self._lock:
+            if key is not None and key in self._keyed:
+                logger.debug(f"Task {key} already pending, not queueing another.")
+                return self._keyed[key]
+
+            if self._queued + self._running >= self.max_workers + self.max_queued:
+                raise ExecutorFull(f"{self._queued} tasks queued and {self._running} running.")
+
+            self._queued += 1
+            submitted_at = monotonic()
+            future = self._pool.submit(self._run, func, args, kwargs, submitted_at)
+            if key is not None:
+                self._keyed[key] = future
+
+        future.add_done_callback(lambda f: self._finish(f, key, on_done, on_error))
+        return future
+
+    def _run(self, func: Callable, args: tuple, kwargs: dict, submitted_at: float):
+        started_at = monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += started_at - submitted_at
+        try:
+            return func(*args, **kwargs)
+        finally:
+            finished_at = monotonic()
+            with self._lock:
+                self._running -= 1
+                self._total_run += finished_at - started_at
+                self._last_latency = finished_at - submitted_at
+
+    def _finish(self, future: Future, key: Hashable, on_done: Callable, on_error: Callable):
+        with self._lock:
+            if key is not None and self._keyed.get(key) is future:
+                del self._keyed[key]
+            if future.cancelled():
+                # Dropped by `shutdown` before it started.
+                self._queued -= 1
+                return
+            err = future.exception()
+            if err is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+        if err is not None:
+            logger.error(f"Background task {key or ''} failed: {err!r}", exc_info=err)
+            if on_error:
+                self._callbacks.put((on_error, err))
+        elif on_done:
+            self._callbacks.put((on_done, future.result()))
+
+    def _drain_callbacks(self):
+        while True:
+            try:
+                func, arg = self._callbacks.get_nowait()
+            except Empty:
+                break
+            try:
+                func(arg)
+            except Exception as e:
+                logger.exception(f"Exception in task callback {func}: {e}")
+        self._root.after(self.POLL_MS, self._drain_callbacks)
+
+    def is_pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._keyed
+
+    def pending_keys(self) -> 'list[Hashable]':
+        with self._lock:
+            return list(self._keyed)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth and task latency (seconds).
+        """
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "mean_wait": self._total_wait / finished if finished else 0.,
+                "mean_run": self._total_run / finished if finished else 0.,
+                "last_latency": self._last_latency,
+            }
+
+    def shutdown(self):
+        """
+        Cancel queued tasks. Running tasks can't be interrupted; see `running`.
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return self._running
@@ -0,0 +1,52 @@
+"""
+Firmware image analysis for writing only the pages that matter.
+
+Erased flash reads as 0xFF, so once the target region has been erased, pages of an image that are
+all 0xFF (trailing build padding, reserved gaps) don't need writing. The image is split into
+segments of used pages; gaps shorter than `MIN_SKIP_GAP` stay inside a segment since every extra
+segment is another `bossac` run, which costs more than writing a few KB.
+"""
+from typing import Union
+import numpy as np
+
+from TelosAirSAMDBoardFlashGUI.util.samba import PAGE_SIZE
+
+MIN_SKIP_GAP = 16 * 1024 # bytes
+
+class ImageLayout(object):
+    def __init__(self, size: int, segments: 'list[tuple[int, int]]'):
+        self.size = size
+        self.segments = segments # (offset, length), relative to the start of the image
+
+    @property
+    def write_bytes(self) -> int:
+        return sum(length for _, length in self.segments)
+
+    @property
+    def is_trimmed(self) -> bool:
+        return self.segments != [(0, self.size)]
+
+    def __repr__(self) -> str:
+        return f"<ImageLayout {self.write_bytes}/{self.size} bytes in {len(self.segments)} segments>"
+
+def analyse_image(data: Union[bytes, bytearray], page_size: int = PAGE_SIZE, min_skip_gap: int = MIN_SKIP_GAP) -> ImageLayout:
+    """
+    Find the segments of `data` that have to be written to an erased region.
+    """
+    size = len(data)
+    if size == 0:
+        return ImageLayout(0, [])
+
+    # Pad the last partial page with 0xFF; it reads that way from erased flash anyway.
+    pad = -size % page_size
+    buf = np.frombuffer(bytes(data) + b"\xff" * pad if pad else data, dtype=np.uint8)
+    used = np.flatnonzero((buf.reshape(-1, page_size) != 0xFF).any(axis=1))
+    if used.size == 0:
+        return ImageLayout(size, [])
+
+    # Split wherever more than `min_skip_gap` worth of blank pages separate two used pages.
+    # The first segment always starts at the image start: that write is the one that erases, from its offset on.
+    breaks = np.flatnonzero(np.diff(used) > min_skip_gap // page_size)
+    starts = np.concatenate(([0], used[breaks + 1])) * page_size
+    ends = np.minimum((np.concatenate((used[breaks], [used[-1]])) + 1) * page_size, size)
+    return ImageLayout(size, [(int(s), int(e - s)) for s, e in zip(starts, ends)])
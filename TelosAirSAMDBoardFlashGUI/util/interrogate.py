@@ -0,0 +1,170 @@
+"""
+Identify the firmware a connected board is running by listening to its USB serial port.
+
+Every board is probed in parallel with its own deadline, so a refresh takes about as long as the
+slowest single port. Firmware is recognised by:
+
+* an ID query: firmware that supports it answers `ID_QUERY` with a line `ID:<name>`,
+* PMS5003 frames (`0x42 0x4D`, length 28, valid checksum) passed through by the Plantower sketch,
+* text markers printed by the AlphaSense OPC-R2 sketch.
+
+Results are cached per serial number until the board re-enumerates (shows up on a different
+port/PID or disappears), since opening every port on each refresh costs up to `PROBE_DEADLINE`.
+"""
+from TelosAirSAMDBoardFlashGUI.models.board import Board
+from TelosAirSAMDBoardFlashGUI.util.bossa import BOOTLOADER_PID_VID, board_device_path, board_port_lock
+from concurrent.futures import ThreadPoolExecutor
+from serial import Serial, SerialException
+from threading import Lock
+from time import time
+from typing import Union
+import struct
+
+import logging
+logger = logging.getLogger("Flash")
+
+PROBE_BAUDRATE = 115200
+PROBE_DEADLINE = 2.5 # seconds, per port
+ID_QUERY = b"ID?\n"
+ID_REPLY_PREFIX = b"ID:"
+
+FIRMWARE_PLANTOWER = "Plantower PMS5003"
+FIRMWARE_ALPHASENSE = "AlphaSense OPC-R2"
+FIRMWARE_BOOTLOADER = "Bootloader"
+FIRMWARE_SILENT = "Unknown (no output)"
+FIRMWARE_FLASHING = "Flashing"
+FIRMWARE_UNKNOWN = "Unknown"
+
+PMS5003_HEADER = b"\x42\x4d"
+PMS5003_FRAME_LEN = 32
+OPC_R2_MARKERS = [b"OPC", b"BinBoundaries"]
+
+def _find_pms5003_frame(data: bytes) -> bool:
+    i = data.find(PMS5003_HEADER)
+    while 0 <= i <= len(data) - PMS5003_FRAME_LEN:
+        frame = data[i:i + PMS5003_FRAME_LEN]
+        length, = struct.unpack_from(">H", frame, 2)
+        checksum, = struct.unpack_from(">H", frame, 30)
+        if length == PMS5003_FRAME_LEN - 4 and sum(frame[:30]) & 0xFFFF == checksum:
+            return True
+        i = data.find(PMS5003_HEADER, i + 1)
+    return False
+
+def classify_output(data: bytes) -> Union[str, None]:
+    """
+    Firmware name for serial output `data`, or `None` if nothing recognisable is in it yet.
+    """
+    for line in data.splitlines():
+        if line.startswith(ID_REPLY_PREFIX):
+            return line[len(ID_REPLY_PREFIX):].decode(errors="replace").strip()
+    if _find_pms5003_frame(data):
+        return FIRMWARE_PLANTOWER
+    if any(marker in data for marker in OPC_R2_MARKERS):
+        return FIRMWARE_ALPHASENSE
+    return None
+
+def probe_port(device_path: str, deadline: float = PROBE_DEADLINE) -> str:
+    """
+    Open `device_path`, ask for an ID and listen until the firmware is recognised or `deadline`
+    seconds pass.
+    """
+    ser = None
+    data = b""
+    timeout_at = time() + deadline
+    try:
+        ser = Serial(device_path, baudrate=PROBE_BAUDRATE, timeout=.1, write_timeout=.5)
+        ser.write(ID_QUERY)
+        while time() < timeout_at:
+            data += ser.read(max(1, ser.in_waiting))
+            found = classify_output(data)
+            if found:
+                return found
+    finally:
+        if ser:
+            ser.close()
+    return FIRMWARE_UNKNOWN if data else FIRMWARE_SILENT
+
+class FirmwareCache(object):
+    """
+    Firmware per serial number, remembered for as long as the board stays enumerated as the
+    same port and PID.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._entries: 'dict[str, tuple]' = {}
+
+    @staticmethod
+    def _identity(board: Board) -> tuple:
+        return (board.port_path, board.pid, board.location)
+
+    def get(self, board: Board) -> Union[str, None]:
+        with self._lock:
+            entry = self._entries.get(board.serial_number)
+        if entry and entry[0] == self._identity(board):
+            return entry[1]
+        return None
+
+    def put(self, board: Board, firmware: str):
+        with self._lock:
+            self._entries[board.serial_number] = (self._identity(board), firmware)
+
+    def retain(self, boards: 'list[Board]'):
+        """
+        Forget boards that are no longer connected.
+        """
+        present = {b.serial_number for b in boards}
+        with self._lock:
+            for sn in list(self._entries):
+                if sn not in present:
+                    del self._entries[sn]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+FIRMWARE_CACHE = FirmwareCache()
+
+def identify_boards(boards: 'list[Board]', deadline: float = PROBE_DEADLINE, cache: FirmwareCache = FIRMWARE_CACHE,
+                    skip: 'set[str]' = frozenset()) -> 'list[Board]':
+    """
+    Set `firmware` on each of `boards`, probing the ones not already cached in parallel.
+    Boards whose serial is in `skip` (being flashed) are never opened.
+    """
+    cache.retain(boards)
+    to_probe = []
+    for board in boards:
+        if board.serial_number in skip:
+            board.firmware = FIRMWARE_FLASHING
+            continue
+        if (board.pid, board.vid) == BOOTLOADER_PID_VID:
+            board.firmware = FIRMWARE_BOOTLOADER
+            continue
+        board.firmware = cache.get(board)
+        if board.firmware is None:
+            to_probe.append(board)
+    if not to_probe:
+        return boards
+
+    def _probe(board: Board):
+        lock = board_port_lock(board.serial_number)
+        if not lock.acquire(blocking=False):
+            # A flash started since `skip` was worked out; leave its port alone.
+            board.firmware = FIRMWARE_FLASHING
+            return
+        try:
+            board.firmware = probe_port(board_device_path(board), deadline)
+            cache.put(board, board.firmware)
+        except (SerialException, OSError) as e:
+            # Busy (e.g. open in a serial monitor) or gone; try again next refresh.
+            logger.warning(f"Couldn't probe {board}: {e}")
+            board.firmware = FIRMWARE_UNKNOWN
+        finally:
+            lock.release()
+
+    start = time()
+    # One short-lived, I/O-bound thread per port: capping it would make a refresh take a
+    # `PROBE_DEADLINE` per round of ports.
+    with ThreadPoolExecutor(max_workers=len(to_probe), thread_name_prefix="TelosAirProbe") as pool:
+        list(pool.map(_probe, to_probe))
+    logger.debug(f"Probed {len(to_probe)} boards in {time() - start:.2f}s: {[(b.serial_number, b.firmware) for b in to_probe]}")
+    return boards
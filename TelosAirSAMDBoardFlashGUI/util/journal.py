@@ -0,0 +1,172 @@
+"""
+Crash-safe journal of batch flashes.
+
+Each batch appends, as JSON lines, its intent (the full plan), every board's stage transitions
+and finally an end record. Writes are flushed to the OS straight away but only `fsync`ed every
+`FSYNC_EVERY` records or `FSYNC_INTERVAL` seconds (and always for the batch intent and end), so
+a power cut loses at most the last few transitions, i.e. a few boards get redone, not the batch.
+
+On restart, `unfinished` gives the last batch with no end record and each board's last stage:
+boards that reached `STAGE_DONE` are skipped, boards in `MID_WRITE_STAGES` are re-checked (their
+flash may or may not hold the new image), and everything else is flashed as normal. Boards that
+aren't connected are recorded as `STAGE_SKIPPED`; a batch only gets its end record once every board
+is done (or the operator discards it), so it can be resumed as often as needed.
+"""
+from threading import Lock
+from time import time
+from typing import Union
+from uuid import uuid4
+import json
+import os
+
+import logging
+logger = logging.getLogger("Flash")
+
+STAGE_QUEUED = "queued"
+STAGE_PROVISIONING = "provisioning"
+STAGE_BOOTLOADER = "bootloader"
+STAGE_BACKUP = "backup"
+STAGE_WRITING = "writing"
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+STAGE_SKIPPED = "skipped"
+
+MID_WRITE_STAGES = [STAGE_WRITING]
+
+FSYNC_EVERY = 8
+FSYNC_INTERVAL = 2. # seconds
+
+class JournalEntry(object):
+    def __init__(self, serial_number: str, filepath: str, location: str = None, stage: str = STAGE_QUEUED):
+        self.serial_number = serial_number
+        self.filepath = filepath
+        self.location = location
+        self.stage = stage
+
+    def __repr__(self) -> str:
+        return f"<JournalEntry {self.serial_number} -> {self.filepath} | {self.stage}>"
+
+class UnfinishedBatch(object):
+    def __init__(self, batch_id: str, started_at: float, entries: 'list[JournalEntry]'):
+        self.batch_id = batch_id
+        self.started_at = started_at
+        self.entries = entries
+
+    def count(self, *stages: str) -> int:
+        return len([e for e in self.entries if e.stage in stages])
+
+class BatchJournal(object):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._file = None
+        self._pending = 0
+        self._last_sync = time()
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._drop_torn_tail()
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def _drop_torn_tail(self):
+        """
+        Cut off a partial last line left by a crash, so the next record starts on its own line.
+        """
+        try:
+            with open(self.path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                keep = f.read().rfind(b"\n") + 1
+                logger.warning(f"Dropping {size - keep} bytes of torn journal record.")
+                f.truncate(keep)
+        except FileNotFoundError:
+            pass
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time()
+
+    def _append(self, record: dict, durable: bool = False):
+        record["t"] = time()
+        with self._lock:
+            self._open()
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._pending += 1
+            if durable or self._pending >= FSYNC_EVERY or time() - self._last_sync >= FSYNC_INTERVAL:
+                self._sync()
+
+    def begin_batch(self, entries: 'list[JournalEntry]') -> str:
+        """
+        Record the intent to flash `entries` and return the new batch's ID. The journal is
+        started over first if it holds no unfinished batch.
+        """
+        if self.unfinished() is None:
+            with self._lock:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                open(self.path, "w").close()
+
+        batch_id = uuid4().hex
+        self._append({
+            "type": "batch",
+            "batch": batch_id,
+            "boards": [dict(serial=e.serial_number, image=e.filepath, location=e.location) for e in entries]
+        }, durable=True)
+        return batch_id
+
+    def record_stage(self, batch_id: str, serial_number: str, stage: str):
+        self._append({"type": "stage", "batch": batch_id, "serial": serial_number, "stage": stage})
+
+    def end_batch(self, batch_id: str, reason: str = "finished"):
+        self._append({"type": "end", "batch": batch_id, "reason": reason}, durable=True)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def unfinished(self) -> Union[UnfinishedBatch, None]:
+        """
+        The most recent batch with no end record, if any.
+        """
+        batches: 'dict[str, UnfinishedBatch]' = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn final write from a crash.
+                logger.warning(f"Skipping unreadable journal line: {line!r}")
+                continue
+
+            if record["type"] == "batch":
+                batches[record["batch"]] = UnfinishedBatch(record["batch"], record["t"],
+                    [JournalEntry(b["serial"], b["image"], b.get("location")) for b in record["boards"]])
+            elif record["type"] == "stage" and record["batch"] in batches:
+                for entry in batches[record["batch"]].entries:
+                    if entry.serial_number == record["serial"]:
+                        entry.stage = record["stage"]
+            elif record["type"] == "end":
+                batches.pop(record["batch"], None)
+
+        if not batches:
+            return None
+        return max(batches.values(), key=lambda b: b.started_at)
@@ -0,0 +1,85 @@
+"""
+Linux host support.
+
+udev gives every USB serial device symlinks under `/dev/serial/by-path` (named after the USB
+bus/hub port) and `/dev/serial/by-id` (named after vendor, product and serial). The `by-path`
+link survives the board dropping off the bus and coming back as the bootloader on a possibly
+different `ttyACM` node, so we address boards through it and just re-resolve it afterwards
+instead of re-scanning for the board.
+"""
+from typing import Union
+from time import time, sleep
+import grp
+import os
+import pwd
+import shutil
+
+import logging
+logger = logging.getLogger("Flash")
+
+SERIAL_BY_PATH_DIR = "/dev/serial/by-path"
+SERIAL_BY_ID_DIR = "/dev/serial/by-id"
+
+UDEV_RULE_HINT = 'SUBSYSTEM=="tty", ATTRS{idVendor}=="239a", MODE="0660", GROUP="dialout"'
+
+def _links_in(dir_path: str) -> 'list[str]':
+    try:
+        return [os.path.join(dir_path, name) for name in sorted(os.listdir(dir_path))]
+    except FileNotFoundError:
+        return []
+
+def stable_link(device: str) -> Union[str, None]:
+    """
+    A udev symlink pointing at `device` (e.g. `/dev/ttyACM0`), preferring `by-path` over `by-id`.
+    `None` if udev hasn't made one.
+    """
+    device = os.path.realpath(device)
+    for dir_path in [SERIAL_BY_PATH_DIR, SERIAL_BY_ID_DIR]:
+        for link in _links_in(dir_path):
+            if os.path.realpath(link) == device:
+                return link
+    return None
+
+def resolve_link(link: str, timeout: float = 0) -> Union[str, None]:
+    """
+    The device node `link` points to, waiting up to `timeout` seconds for it to (re)appear.
+    """
+    timeout_at = time() + timeout
+    while True:
+        if os.path.exists(link):
+            return os.path.realpath(link)
+        if time() >= timeout_at:
+            return None
+        sleep(.1)
+
+def check_port_access(device: str):
+    """
+    Raise `PermissionError` with instructions if the current user can't open `device`.
+    """
+    if os.access(device, os.R_OK | os.W_OK):
+        return
+
+    user = pwd.getpwuid(os.getuid()).pw_name
+    group = grp.getgrgid(os.stat(device).st_gid).gr_name
+    groups = [g.gr_name for g in grp.getgrall() if user in g.gr_mem] + [grp.getgrgid(os.getgid()).gr_name]
+    if group in groups:
+        hint = f"{user} is in group {group} but this session isn't yet; log out and back in."
+    else:
+        hint = (f"Add {user} to group {group} (sudo usermod -aG {group} {user}) and log back in, "
+                f"or install a udev rule such as: {UDEV_RULE_HINT}")
+    raise PermissionError(f"No read/write access to {device}. {hint}")
+
+def find_bossac(bundled_path: str) -> Union[str, None]:
+    """
+    The bundled `bossac` is built for Mac OS, so prefer one on `PATH` (e.g. from the
+    `bossa-cli` package) and only fall back to the bundled one if it is a Linux executable.
+    """
+    found = shutil.which("bossac")
+    if found:
+        return found
+    try:
+        with open(bundled_path, "rb") as f:
+            is_elf = f.read(4) == b"\x7fELF"
+    except OSError:
+        return None
+    return bundled_path if is_elf and os.access(bundled_path, os.X_OK) else None
@@ -0,0 +1,209 @@
+"""
+Per-board provisioning.
+
+Firmware that supports provisioning reserves a config block in flash that looks like:
+
+    char     marker[8];      // CONFIG_BLOCK_MARKER
+    uint16_t version;        // CONFIG_BLOCK_VERSION
+    uint16_t payload_len;    // bytes of payload that follow
+    uint32_t device_id;      // \\
+    float    cal[N];         //  } payload, N = (payload_len - 4) / 4
+    uint32_t crc32;          // zlib CRC32 of everything from `marker` through the payload
+
+All fields are little-endian. The compiled `.bin` carries the block with placeholder
+values; at flash time we patch in the record for the board's serial number and fix up the CRC.
+"""
+from pathlib import Path
+from threading import Lock
+from typing import Union
+import csv
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+import zlib
+
+import logging
+logger = logging.getLogger("Flash")
+
+CONFIG_BLOCK_MARKER = b"TACFGBLK"
+CONFIG_BLOCK_VERSION = 1
+
+_HEADER = struct.Struct("<8sHH")
+_CRC = struct.Struct("<I")
+
+class ProvisioningError(Exception):
+    pass
+
+class ProvisioningRecord(object):
+    def __init__(self, serial_number: str, device_id: int, calibration: 'list[float]'):
+        self.serial_number = serial_number
+        self.device_id = device_id
+        self.calibration = calibration
+
+    def __repr__(self) -> str:
+        return f"<ProvisioningRecord {self.serial_number} | id={self.device_id} | cal={self.calibration}>"
+
+_CAL_COLUMN = re.compile(r"^cal(\d+)$", re.IGNORECASE)
+
+def _record_from_row(row: dict) -> ProvisioningRecord:
+    """
+    Build a `ProvisioningRecord` from a CSV/SQLite row. Calibration constants come from the
+    `cal0`, `cal1`, ... columns, each into the slot its index names. Blank cells before the
+    last filled one are written as 0.0.
+    """
+    cal = {}
+    for key, value in row.items():
+        match = _CAL_COLUMN.match(key or "")
+        if match and value not in (None, ""):
+            cal[int(match.group(1))] = value
+    try:
+        return ProvisioningRecord(
+            serial_number=str(row["serial"]).strip(),
+            device_id=int(row["device_id"]),
+            calibration=[float(cal.get(i, 0.0)) for i in range(max(cal) + 1 if cal else 0)]
+        )
+    except (KeyError, ValueError) as e:
+        raise ProvisioningError(f"Malformed provisioning row {dict(row)}: {e}")
+
+class ProvisioningSource(object):
+    """
+    Per-serial provisioning records loaded from a `.csv` (header `serial,device_id,cal0,cal1,...`)
+    or a SQLite database with a `provisioning` table of the same columns.
+    """
+    SQLITE_SUFFIXES = ['.db', '.sqlite', '.sqlite3']
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records: 'dict[str, ProvisioningRecord]' = {}
+        self._db: sqlite3.Connection = None
+
+        if Path(path).suffix.lower() in self.SQLITE_SUFFIXES:
+            # Lookups happen from flash jobs, not the thread that opened the connection.
+            self._db_lock = Lock()
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+        else:
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    rec = _record_from_row(row)
+                    self._records[rec.serial_number] = rec
+            logger.info(f"Loaded {len(self._records)} provisioning records from {path}.")
+
+    def get(self, serial_number: str) -> Union[ProvisioningRecord, None]:
+        if self._db is None:
+            return self._records.get(serial_number)
+
+        with self._db_lock:
+            row = self._db.execute("SELECT * FROM provisioning WHERE serial = ?", (serial_number,)).fetchone()
+        return _record_from_row(dict(row)) if row else None
+
+class ProvisioningImage(object):
+    """
+    A base firmware image mapped once into memory and patched per board.
+
+    The file is mapped copy-on-write (`ACCESS_COPY`), so patching only dirties the page(s)
+    holding the config block and the base image is never re-read or modified on disk.
+    """
+    def __init__(self, base_path: str, out_dir: str = None):
+        self.base_path = base_path
+        self.out_dir = out_dir or tempfile.mkdtemp(prefix="telosair-provision-")
+        self._lock = Lock()
+
+        self._file = open(base_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        self.block_offset = self._mm.find(CONFIG_BLOCK_MARKER)
+        if self.block_offset < 0:
+            self.close()
+            raise ProvisioningError(f"No config block marker found in {base_path}.")
+        if self._mm.find(CONFIG_BLOCK_MARKER, self.block_offset + 1) >= 0:
+            self.close()
+            raise ProvisioningError(f"More than one config block marker found in {base_path}.")
+
+        _, version, self.payload_len = _HEADER.unpack_from(self._mm, self.block_offset)
+        if version != CONFIG_BLOCK_VERSION:
+            self.close()
+            raise ProvisioningError(f"Unsupported config block version {version} in {base_path}.")
+        if self.payload_len < 4 or self.payload_len % 4:
+            self.close()
+            raise ProvisioningError(f"Invalid config block payload length {self.payload_len} in {base_path}.")
+
+        self.block_len = _HEADER.size + self.payload_len + _CRC.size
+        if self.block_offset + self.block_len > len(self._mm):
+            self.close()
+            raise ProvisioningError(f"Config block in {base_path} runs past the end of the image.")
+
+        self.cal_slots = (self.payload_len - 4) // 4
+        logger.debug(f"Config block in {base_path} @ 0x{self.block_offset:X}, {self.cal_slots} calibration slots.")
+
+    def build_block(self, record: ProvisioningRecord) -> bytes:
+        """
+        Serialise `record` into a complete config block (header, payload and CRC).
+        """
+        if len(record.calibration) > self.cal_slots:
+            raise ProvisioningError(f"{record.serial_number} has {len(record.calibration)} calibration constants, "
+                                    f"image only has room for {self.cal_slots}.")
+        cal = record.calibration + [0.0] * (self.cal_slots - len(record.calibration))
+        body = _HEADER.pack(CONFIG_BLOCK_MARKER, CONFIG_BLOCK_VERSION, self.payload_len) \
+            + struct.pack(f"<I{self.cal_slots}f", record.device_id & 0xFFFFFFFF, *cal)
+        return body + _CRC.pack(zlib.crc32(body))
+
+    def write_for(self, record: ProvisioningRecord) -> str:
+        """
+        Write a copy of the base image with `record` patched in and return its path.
+        """
+        block = self.build_block(record)
+        out_path = os.path.join(self.out_dir, f"{Path(self.base_path).stem}-{record.serial_number}.bin")
+        with self._lock:
+            self._mm[self.block_offset:self.block_offset + self.block_len] = block
+            with open(out_path, "wb") as f:
+                f.write(self._mm)
+
+        logger.info(f"Provisioned {record.serial_number} @ 0x{self.block_offset:X}: {block.hex()}")
+        return out_path
+
+    def release(self, path: str):
+        """
+        Delete a patched image returned by `write_for` once it has been flashed.
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+class Provisioner(object):
+    """
+    Turns a base image path + board serial into a provisioned image path. Base images are
+    mapped on first use and kept open for the life of the `Provisioner`.
+    """
+    def __init__(self, source: ProvisioningSource):
+        self.source = source
+        self._images: 'dict[str, ProvisioningImage]' = {}
+        self._lock = Lock()
+
+    def _image(self, base_path: str) -> ProvisioningImage:
+        with self._lock:
+            if base_path not in self._images:
+                self._images[base_path] = ProvisioningImage(base_path)
+            return self._images[base_path]
+
+    def provision(self, base_path: str, serial_number: str) -> str:
+        record = self.source.get(serial_number)
+        if record is None:
+            raise ProvisioningError(f"No provisioning record for serial {serial_number}.")
+        return self._image(base_path).write_for(record)
+
+    def release(self, base_path: str, provisioned_path: str):
+        """
+        Delete an image returned by `provision` once it's no longer needed.
+        """
+        self._image(base_path).release(provisioned_path)
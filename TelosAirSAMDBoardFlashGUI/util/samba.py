@@ -0,0 +1,162 @@
+"""
+Minimal SAM-BA client for boards already in bootloader mode, used to verify a write (or re-check
+an interrupted one) after `bossac` has written it without `-v`.
+
+The Arduino/Adafruit SAMD bootloaders advertise protocol extensions in their version string
+(`[Arduino:XYZ]`); `Z` means the bootloader can CRC16 a flash region itself, so verifying costs
+a few short commands instead of a full read-back. Without it the whole region is read back.
+BOSSA 1.9's `bossac -v` already uses `Z` when it's there, so `VERIFY_CRC` is not faster than
+`VERIFY_FULL` on those bootloaders; only `VERIFY_SAMPLED` trades coverage for speed.
+"""
+from serial import Serial
+from random import Random
+import re
+
+import logging
+logger = logging.getLogger("Flash")
+
+SAMBA_BAUDRATE = 921600
+PAGE_SIZE = 64
+# Largest region the bootloader will checksum in one `Z` command (its write buffer size).
+CHECKSUM_BLOCK_SIZE = 4096
+
+# Cortex-M0+ AIRCR: VECTKEY | SYSRESETREQ
+_AIRCR_ADDR = 0xE000ED0C
+_AIRCR_RESET = 0x05FA0004
+
+VERIFY_FULL = "full"        # bossac -v (bootloader CRC if supported, otherwise a full read-back)
+VERIFY_CRC = "crc"          # bootloader CRC of the region, full read-back if unsupported
+VERIFY_SAMPLED = "sampled"  # read back a few pages only; opt-in, misses most corruption
+VERIFY_MODES = [VERIFY_FULL, VERIFY_CRC, VERIFY_SAMPLED]
+
+def _crc16_table() -> 'list[int]':
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+_CRC16_TABLE = _crc16_table()
+
+def crc16(data: bytes, crc: int = 0) -> int:
+    """
+    CRC16-CCITT (poly 0x1021, init 0), as computed by the bootloader's `Z` command.
+    """
+    table = _CRC16_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+class SambaError(Exception):
+    pass
+
+class Samba(object):
+    def __init__(self, device_path: str, timeout: float = 2):
+        self.ser = Serial(device_path, baudrate=SAMBA_BAUDRATE, timeout=timeout)
+        # Binary mode, so replies aren't echoed/terminal-formatted.
+        self.ser.write(b"N#")
+        self.ser.read(2)
+        self.version = self._command("V#").decode(errors="replace").strip()
+        match = re.search(r"\[Arduino:([A-Z]+)\]", self.version)
+        self.extensions = set(match.group(1)) if match else set()
+        logger.debug(f"SAM-BA version: {self.version!r}, extensions: {self.extensions}")
+
+    def _command(self, cmd: str) -> bytes:
+        self.ser.reset_input_buffer()
+        self.ser.write(cmd.encode())
+        return self.ser.read_until(b"\n\r")
+
+    @property
+    def can_checksum(self) -> bool:
+        return "Z" in self.extensions
+
+    def checksum(self, addr: int, size: int) -> int:
+        reply = self._command(f"Z{addr:08X},{size:08X}#").decode(errors="replace")
+        match = re.match(r"Z([0-9A-Fa-f]{8})#", reply)
+        if not match:
+            raise SambaError(f"Bad checksum reply {reply!r}")
+        return int(match.group(1), 16)
+
+    def read(self, addr: int, size: int) -> bytes:
+        # Like bossac: the bootloader mishandles USB reads of a power of two > 32 bytes,
+        # so take the first byte separately.
+        head = b""
+        if size > 32 and not (size & (size - 1)):
+            self.ser.write(f"o{addr:08X},4#".encode())
+            head = self.ser.read(1)
+            addr, size = addr + 1, size - 1
+        self.ser.write(f"R{addr:08X},{size:08X}#".encode())
+        data = head + self.ser.read(size)
+        if len(data) != len(head) + size:
+            raise SambaError(f"Short read at 0x{addr:08X}: {len(data)} of {len(head) + size} bytes")
+        return data
+
+    def reset(self):
+        self.ser.write(f"W{_AIRCR_ADDR:08X},{_AIRCR_RESET:08X}#".encode())
+
+    def close(self):
+        self.ser.close()
+
+def _sampled_pages(size: int, samples: int, seed: str) -> 'list[int]':
+    pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+    picks = {0, pages - 1}
+    # Seeded per image so a retry checks the same pages.
+    picks.update(Random(seed).sample(range(pages), min(samples, pages)))
+    return sorted(picks)
+
+def verify_region(samba: Samba, addr: int, image: bytes, mode: str = VERIFY_CRC, samples: int = 16) -> bool:
+    """
+    Check that flash at `addr` holds `image`, using the bootloader's CRC if `mode` is `VERIFY_CRC`
+    and it's supported, otherwise a full read-back. Only `VERIFY_SAMPLED` reads back just `samples`
+    random pages plus the first and last.
+    """
+    if mode == VERIFY_CRC and samba.can_checksum:
+        for offset in range(0, len(image), CHECKSUM_BLOCK_SIZE):
+            block = image[offset:offset + CHECKSUM_BLOCK_SIZE]
+            expected = crc16(block)
+            actual = samba.checksum(addr + offset, len(block))
+            if actual != expected:
+                logger.error(f"CRC of {len(block)} bytes @ 0x{addr + offset:X}: board 0x{actual:04X}, image 0x{expected:04X}")
+                return False
+        return True
+
+    if mode != VERIFY_SAMPLED:
+        logger.info("Bootloader can't checksum, falling back to a full read-back.")
+        for offset in range(0, len(image), CHECKSUM_BLOCK_SIZE):
+            block = image[offset:offset + CHECKSUM_BLOCK_SIZE]
+            if samba.read(addr + offset, len(block)) != block:
+                logger.error(f"{len(block)} bytes @ 0x{addr + offset:X} don't match image.")
+                return False
+        return True
+
+    for page in _sampled_pages(len(image), samples, seed=str(crc16(image))):
+        offset = page * PAGE_SIZE
+        expected = image[offset:offset + PAGE_SIZE]
+        if samba.read(addr + offset, len(expected)) != expected:
+            logger.error(f"Page @ 0x{addr + offset:X} doesn't match image.")
+            return False
+    return True
+
+def verify_segments_and_reset(device_path: str, segments: 'list[tuple[int, bytes]]', mode: str = VERIFY_CRC) -> bool:
+    """
+    Verify each `(addr, data)` in `segments` was written on the board at `device_path` and, if so,
+    reset it into the new firmware. A board that fails is left in bootloader mode.
+    """
+    samba = Samba(device_path)
+    try:
+        ok = all(verify_region(samba, addr, data, mode) for addr, data in segments)
+        if ok:
+            samba.reset()
+        return ok
+    finally:
+        samba.close()
+
+def verify_and_reset(device_path: str, addr: int, filepath: str, mode: str = VERIFY_CRC) -> bool:
+    """
+    Verify `filepath` was written at `addr` on the board at `device_path`, see `verify_segments_and_reset`.
+    """
+    with open(filepath, "rb") as f:
+        image = f.read()
+    return verify_segments_and_reset(device_path, [(addr, image)], mode)
@@ -1,6 +1,9 @@
 from threading import Event, Thread
 from TelosAirSAMDBoardFlashGUI.context import CONTEXT
 from typing import Callable
+import logging
+
+logger = logging.getLogger("TelosAir")
 
 class JobThread(Thread):
     def __init__(self, done_event_signals: 'list[str]', task_func: Callable):
@@ -11,7 +14,7 @@ class JobThread(Thread):
     def run(self):
         try:
             self.task_func()
-        except Exception:
-            pass
+        except Exception as e:
+            logger.exception(f"Exception in job {self.task_func}: {e}")
 
         self.signal_done()
\ No newline at end of file